@@ -33,7 +33,13 @@ def create_app():
         'pool_pre_ping': True,
     }
     
-    print(f"✅ Using MySQL database: {db_name}")
+    # A full database URL (e.g. sqlite:///check.db for scripts) overrides the MySQL settings
+    if os.environ.get('DATABASE_URL'):
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        print(f"✅ Using database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}")
+    else:
+        print(f"✅ Using MySQL database: {db_name}")
     
     # Security headers
     @app.after_request
@@ -73,6 +79,18 @@ def create_app():
     # Register custom filters
     from .filters import filters_blueprint
     app.register_blueprint(filters_blueprint)
+    
+    # Template fragment caching and the compiled template cache
+    from . import templating
+    templating.init_app(app)
+    
+    # Opt-in per-request profiling for admins (?_profile=1)
+    from . import profiling
+    profiling.init_app(app)
+    
+    # Register listeners that keep the statistics counters, symptom index, risk scores,
+    # region rollups and water-quality statistics, and feed the live update streams
+    from . import counters, symptom_index, risk, regions, anomaly, live
 
     # User loader callback
     from .models import User
@@ -89,10 +107,55 @@ def create_app():
     # Create database tables and default data
     with app.app_context():
         db.create_all()
+        ensure_columns()
+        ensure_indexes()
         create_default_data()
 
     return app
 
+def ensure_columns():
+    """Add nullable model columns that existing tables are missing"""
+    from sqlalchemy import inspect
+    
+    # create_all() never alters tables that already exist
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                print(f"⚠️ Column {table.name}.{column.name} is missing and must be added manually")
+                continue
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} {column.type.compile(db.engine.dialect)}"
+                )
+            print(f"✅ Added column {column.name} to {table.name}")
+
+def ensure_indexes():
+    """Create indexes declared on the models that existing tables are missing"""
+    from sqlalchemy import inspect
+    
+    # create_all() only adds indexes when it creates the table itself
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # Skip dialect-specific indexes (e.g. MySQL FULLTEXT) on other backends
+            ddl_if = getattr(index, '_ddl_if', None)
+            if ddl_if is not None and ddl_if.dialect not in (None, db.engine.dialect.name):
+                continue
+            if index.name not in existing:
+                index.create(db.engine)
+                print(f"✅ Created index {index.name} on {table.name}")
+
 def create_default_data():
     """Create default data if it doesn't exist"""
     from .models import User, Disease, Location, Case, EnvironmentalData, Alert
@@ -128,7 +191,8 @@ def create_default_data():
         {'name': 'Cholera', 'description': 'Acute diarrheal infection caused by ingestion of contaminated food or water'},
         {'name': 'Typhoid', 'description': 'Bacterial infection caused by Salmonella typhi spread through contaminated food and water'},
         {'name': 'Hepatitis A', 'description': 'Liver infection caused by a virus spread through contaminated food and water'},
-        {'name': 'Giardiasis', 'description': 'Intestinal infection caused by Giardia parasite found in soil, food, or water contaminated with feces'}
+        {'name': 'Giardiasis', 'description': 'Intestinal infection caused by Giardia parasite found in soil, food, or water contaminated with feces'},
+        {'name': 'Unconfirmed', 'description': 'Reported illness awaiting diagnosis; a disease is suggested from the symptoms'}
     ]
     
     for disease_data in diseases:
@@ -156,6 +220,9 @@ def create_default_data():
             )
             db.session.add(location)
     
+    if any(isinstance(obj, (Disease, Location)) for obj in db.session.new):
+        from . import reference
+        reference.bump_all()
     db.session.commit()
     
     # Add some sample cases and environmental data
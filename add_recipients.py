@@ -1,5 +1,7 @@
 from app import create_app, db
 from app.models import Location, Recipient
+from app.counters import recount
+from app.recipient_import import location_summary
 
 app = create_app()
 
@@ -48,13 +50,15 @@ with app.app_context():
             recipient_count += 1
     
     db.session.commit()
+    # The bulk delete above bypasses the counter listeners
+    recount()
     print(f"\n✅ Successfully added {recipient_count} recipients across {len(locations)} locations!")
     
     # Show summary
     print("\n📊 Summary by Location:")
-    for location in locations:
-        count = Recipient.query.filter_by(location_id=location.id).count()
-        print(f"  - {location.name}: {count} recipients")
+    for name, count in location_summary():
+        print(f"  - {name}: {count} recipients")
     
     print("\n💡 Note: Update phone numbers in this script with real numbers before production use!")
     print("   Current phone numbers are samples and will repeat across locations.")
+    print("   To load real recipients from a spreadsheet use: flask import-recipients recipients.csv")
@@ -0,0 +1,231 @@
+"""
+Streaming anomaly detection on water-quality readings.
+
+Each location keeps running statistics per metric (pH, turbidity,
+temperature) in reading_stats: a Welford count/mean/M2 and the last few
+values for a rolling median, so memory per location is constant and no
+reading history is queried. When a flush inserts EnvironmentalData rows the
+statistics of their locations are loaded (one query), updated and checked:
+
+    spike  the value is SPIKE_Z standard deviations from the running mean
+           while the rolling median is not (a single bad reading)
+    drift  the rolling median has moved DRIFT_Z standard deviations from
+           the running mean (the source itself is changing)
+
+Spikes are kept out of the running mean so one outlier does not shift it;
+drifted values are folded in so the baseline follows a lasting change.
+Findings are raised as alerts through the alert suppression layer when the
+transaction commits, so repeated findings merge into the open alert and a
+metric it does not mention yet is appended to its message.
+Readings added with bulk inserts bypass the detector; `flask
+rebuild-water-stats` replays the full history into fresh statistics.
+"""
+import math
+import statistics
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .models import db, EnvironmentalData, ReadingStats
+
+# metric -> (label, unit, smallest standard deviation trusted)
+METRICS = {
+    'ph': ('pH', '', 0.1),
+    'turbidity': ('Turbidity', ' NTU', 0.5),
+    'temperature': ('Temperature', '°C', 0.5),
+}
+
+# Readings needed before a location's statistics are trusted
+MIN_SAMPLES = 10
+
+# Values kept for the rolling median
+WINDOW = 7
+
+SPIKE_Z = 4.0
+DRIFT_Z = 2.0
+
+SEVERITY = {'spike': 'High', 'drift': 'Medium'}
+
+
+def _recent(row):
+    return [float(value) for value in row.recent.split(',') if value] if row.recent else []
+
+
+def _fold(row, value):
+    """Welford update of count, mean and M2."""
+    row.count = (row.count or 0) + 1
+    mean = row.mean or 0.0
+    delta = value - mean
+    row.mean = mean + delta / row.count
+    row.m2 = (row.m2 or 0.0) + delta * (value - row.mean)
+
+
+def std(row):
+    """Standard deviation of the folded values, at least the metric's floor."""
+    floor = METRICS[row.metric][2]
+    if not row.count or row.count < 2:
+        return floor
+    return max(math.sqrt(row.m2 / (row.count - 1)), floor)
+
+
+def observe(row, value, now=None):
+    """Update row with one reading; returns (kind, z, median) for an anomaly or None."""
+    window = (_recent(row) + [value])[-WINDOW:]
+    finding = None
+    fold = True
+
+    if (row.count or 0) >= MIN_SAMPLES:
+        deviation = std(row)
+        z = (value - row.mean) / deviation
+        median = statistics.median(window)
+        drift = (median - row.mean) / deviation
+        if len(window) == WINDOW and abs(drift) >= DRIFT_Z:
+            finding = ('drift', drift, median)
+        elif abs(z) >= SPIKE_Z:
+            finding = ('spike', z, value)
+            fold = False
+
+    if fold:
+        _fold(row, value)
+    row.recent = ','.join(f'{recent:g}' for recent in window)
+    row.updated_at = now or datetime.now()
+    return finding
+
+
+def subject(metric, kind):
+    """Opening words of a finding's text, shared by every finding of that metric and kind."""
+    label = METRICS[metric][0]
+    return f"{label} reading of" if kind == 'spike' else f"{label} has drifted"
+
+
+def describe(row, kind, z, value):
+    unit = METRICS[row.metric][1]
+    typical = f"typical {row.mean:.1f} ± {std(row):.1f}{unit}"
+    direction = 'high' if z > 0 else 'low'
+    if kind == 'spike':
+        return f"{subject(row.metric, kind)} {value:.1f}{unit} is unusually {direction} ({typical})"
+    return f"{subject(row.metric, kind)} {'up' if z > 0 else 'down'} to {value:.1f}{unit} ({typical})"
+
+
+def _new_stats(location_id, metric):
+    return ReadingStats(location_id=location_id, metric=metric, count=0, mean=0.0, m2=0.0, recent='')
+
+
+@event.listens_for(Session, 'before_flush')
+def _observe_readings(session, flush_context, instances):
+    readings = [
+        obj for obj in session.new
+        if isinstance(obj, EnvironmentalData) and obj.location_id is not None
+    ]
+    if not readings:
+        return
+    readings.sort(key=lambda reading: reading.timestamp or datetime.max)
+
+    with session.no_autoflush:
+        stats = {
+            (row.location_id, row.metric): row
+            for row in session.query(ReadingStats).filter(
+                ReadingStats.location_id.in_({reading.location_id for reading in readings})
+            ).with_for_update()
+        }
+
+    findings = session.info.setdefault('water_anomalies', [])
+    for reading in readings:
+        for metric in METRICS:
+            value = getattr(reading, metric)
+            if value is None:
+                continue
+            key = (reading.location_id, metric)
+            row = stats.get(key)
+            if row is None:
+                row = stats[key] = _new_stats(*key)
+                session.add(row)
+            finding = observe(row, float(value))
+            if finding:
+                kind, z, shown = finding
+                findings.append((reading.location_id, metric, kind, abs(z), describe(row, kind, z, shown)))
+
+
+@event.listens_for(Session, 'before_commit')
+def _raise_alerts(session):
+    if not session.info.get('water_anomalies') and not any(
+        isinstance(obj, EnvironmentalData) for obj in session.new
+    ):
+        return
+    # Readings still pending are checked by this flush
+    session.flush()
+    findings = session.info.pop('water_anomalies', [])
+    if not findings:
+        return
+
+    from .reference import location as reference_location
+    from .suppression import SEVERITY_RANK, submit_alert
+
+    # Several readings in one transaction can repeat a finding; keep the worst
+    worst = {}
+    for location_id, metric, kind, z, text in findings:
+        key = (location_id, metric, kind)
+        if key not in worst or z > worst[key][0]:
+            worst[key] = (z, text)
+
+    by_location = {}
+    for (location_id, metric, kind), (_, text) in worst.items():
+        severity, parts = by_location.get(location_id, ('Low', []))
+        if SEVERITY_RANK[SEVERITY[kind]] > SEVERITY_RANK[severity]:
+            severity = SEVERITY[kind]
+        by_location[location_id] = (severity, parts + [(subject(metric, kind), text)])
+
+    for location_id, (severity, parts) in by_location.items():
+        location = reference_location(location_id)
+        name = location.name if location and location.name else f'location {location_id}'
+        text = '; '.join(part for _, part in parts)
+        alert, outcome = submit_alert(location_id, severity, f"Water quality anomaly at {name}: {text}")
+        if outcome == 'suppressed' and alert is not None:
+            # The open alert is keyed on severity only; add metrics it does not mention yet
+            new = [part for opening, part in parts if opening not in alert.message]
+            if not new:
+                continue
+            alert.message += '; ' + '; '.join(new)
+            text = '; '.join(new)
+        print(f"⚠️ Water quality anomaly at {name}: {text}")
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_findings(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('water_anomalies', None)
+
+
+def rebuild(batch_size=5000):
+    """Replay every reading into fresh statistics (no alerts); returns readings seen."""
+    ReadingStats.query.delete()
+    table = EnvironmentalData.__table__
+    rows = db.session.execute(
+        select(table.c.location_id, *(table.c[metric] for metric in METRICS)).order_by(
+            table.c.location_id, table.c.timestamp, table.c.id
+        ).execution_options(yield_per=batch_size)
+    )
+
+    seen = 0
+    current_id, stats = None, {}
+    now = datetime.now()
+    pending = []
+    for location_id, *values in rows:
+        if location_id != current_id:
+            pending.extend(stats.values())
+            current_id, stats = location_id, {}
+        for metric, value in zip(METRICS, values):
+            if value is None:
+                continue
+            row = stats.get(metric)
+            if row is None:
+                row = stats[metric] = _new_stats(location_id, metric)
+            observe(row, float(value), now)
+        seen += 1
+    pending.extend(stats.values())
+
+    # Written after the scan so the open result is not disturbed
+    db.session.add_all(pending)
+    db.session.commit()
+    return seen
@@ -0,0 +1,114 @@
+"""
+Archival of old cases, alerts and SMS history into cold tables.
+
+Rows older than a horizon are copied into the archived_* tables and deleted
+from the live tables in bounded batches. Each batch commits together with a
+checkpoint, so an interrupted run resumes where it stopped and the live
+tables (and their indexes) stay small. Symptom postings of archived cases
+move with them, so symptom searches can still include archived cases.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, literal, select
+
+from .models import (db, Alert, ArchiveCheckpoint, ArchivedAlert, ArchivedCase,
+                     ArchivedSMSHistory, ArchivedSymptomPosting, Case, CaseClassification,
+                     SMSHistory, SymptomPosting)
+from .counters import bump
+
+# name -> (live model, archive model, date column)
+ARCHIVES = {
+    'case': (Case, ArchivedCase, 'case_date'),
+    'alert': (Alert, ArchivedAlert, 'alert_date'),
+    'sms_history': (SMSHistory, ArchivedSMSHistory, 'sent_at'),
+}
+
+# name -> (live model, archive model) of rows keyed by case_id that move with a live row
+MOVED_WITH = {
+    'case': [(SymptomPosting, ArchivedSymptomPosting)],
+}
+
+# name -> rows keyed by a live row's id that are dropped with it (the archive keeps no copy)
+DROPPED_WITH = {
+    'case': [CaseClassification.__table__.c.case_id],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _load_checkpoint(name, horizon):
+    checkpoint = ArchiveCheckpoint.query.get(name)
+    if checkpoint is None:
+        checkpoint = ArchiveCheckpoint(table_name=name)
+        db.session.add(checkpoint)
+    if checkpoint.horizon != horizon:
+        # A different horizon may cover rows below the old checkpoint
+        checkpoint.horizon = horizon
+        checkpoint.last_id = 0
+        checkpoint.moved = 0
+    return checkpoint
+
+
+def archive_table(name, horizon, batch_size=DEFAULT_BATCH_SIZE):
+    """Move rows of one table older than horizon into its archive; returns rows moved."""
+    live, cold, date_column = ARCHIVES[name]
+    live_table, cold_table = live.__table__, cold.__table__
+    columns = [column.name for column in live_table.columns]
+
+    checkpoint = _load_checkpoint(name, horizon)
+    db.session.commit()
+    moved = 0
+
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(live_table.c.id).where(
+                live_table.c[date_column] < horizon,
+                live_table.c.id > checkpoint.last_id
+            ).order_by(live_table.c.id).limit(batch_size)
+        )]
+        if not ids:
+            break
+
+        # Copy, delete and checkpoint in one transaction
+        db.session.execute(cold_table.insert().from_select(
+            columns + ['archived_at'],
+            select(*[live_table.c[column] for column in columns], literal(datetime.now())).where(
+                live_table.c.id.in_(ids)
+            )
+        ))
+        db.session.execute(live_table.delete().where(live_table.c.id.in_(ids)))
+        for live_dependent, cold_dependent in MOVED_WITH.get(name, []):
+            dependent_table = live_dependent.__table__
+            db.session.execute(cold_dependent.__table__.insert().from_select(
+                [column.name for column in dependent_table.columns],
+                select(dependent_table).where(dependent_table.c.case_id.in_(ids))
+            ))
+            db.session.execute(dependent_table.delete().where(dependent_table.c.case_id.in_(ids)))
+        for column in DROPPED_WITH.get(name, []):
+            # Suggestions for archived cases would otherwise linger
+            db.session.execute(column.table.delete().where(column.in_(ids)))
+        if live is Alert:
+            # Archived alerts are no longer active; SMS counters are lifetime totals
+            bump('alerts_total', -len(ids))
+
+        checkpoint.last_id = ids[-1]
+        checkpoint.moved += len(ids)
+        checkpoint.updated_at = datetime.now()
+        db.session.commit()
+        moved += len(ids)
+        print(f"  {name}: moved {moved} rows (up to id {ids[-1]})")
+
+    return moved
+
+
+def archive_all(horizon, batch_size=DEFAULT_BATCH_SIZE, tables=None):
+    """Archive every (or the selected) table; returns {table: rows moved}."""
+    return {name: archive_table(name, horizon, batch_size) for name in (tables or ARCHIVES)}
+
+
+def archived_counts():
+    """Row counts of the archive tables."""
+    return {
+        name: db.session.query(func.count(cold.id)).scalar()
+        for name, (_, cold, _) in ARCHIVES.items()
+    }
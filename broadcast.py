@@ -0,0 +1,117 @@
+"""
+Broadcast planning for SMS alerts.
+
+Before anything is sent the target recipients are collapsed to unique E.164
+numbers and the message is measured in SMS segments, so admins can preview
+how many texts a broadcast costs and how long it will take.
+"""
+import math
+import os
+import re
+
+# GSM 03.38 basic character set (one septet each)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+
+# GSM 03.38 extension table (escape + character, two septets each)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Characters per segment: (single message, per part of a concatenated message)
+SEGMENT_LIMITS = {
+    'GSM-7': (160, 153),
+    'UCS-2': (70, 67),
+}
+
+
+def normalize_phone(number, default_country_code=None):
+    """Normalize a phone number to E.164, or return None if it is not valid."""
+    if not number:
+        return None
+    if default_country_code is None:
+        default_country_code = os.environ.get('SMS_DEFAULT_COUNTRY_CODE', '91')
+
+    number = number.strip()
+    has_plus = number.startswith('+')
+    digits = re.sub(r'\D', '', number)
+
+    if has_plus:
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0') and len(digits) == 11:
+        # National trunk prefix, e.g. 09876543210
+        digits = default_country_code + digits[1:]
+    elif len(digits) == 10:
+        digits = default_country_code + digits
+
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return '+' + digits
+
+
+def message_segments(message):
+    """Return (encoding, length_in_units, segments) for an SMS body."""
+    message = message or ''
+    if all(char in GSM7_BASIC or char in GSM7_EXTENDED for char in message):
+        encoding = 'GSM-7'
+        units = sum(2 if char in GSM7_EXTENDED else 1 for char in message)
+    else:
+        encoding = 'UCS-2'
+        # Characters outside the BMP take two UTF-16 code units
+        units = len(message.encode('utf-16-le')) // 2
+
+    single, part = SEGMENT_LIMITS[encoding]
+    segments = 1 if units <= single else math.ceil(units / part)
+    return encoding, units, segments
+
+
+class BroadcastPlan:
+    """Unique destinations and cost estimate for one SMS broadcast."""
+
+    def __init__(self, recipients, message, send_rate=None):
+        if send_rate is None:
+            send_rate = float(os.environ.get('SMS_SEND_RATE', '1'))
+        self.message = message
+        self.send_rate = send_rate
+        self.total_recipients = len(recipients)
+
+        # E.164 number -> first recipient registered with it
+        self.targets = {}
+        self.invalid = []
+        for recipient in recipients:
+            number = normalize_phone(recipient.phone_number)
+            if number is None:
+                self.invalid.append(recipient)
+            elif number not in self.targets:
+                self.targets[number] = recipient
+
+        self.encoding, self.units, self.segments = message_segments(message)
+
+    @property
+    def unique_numbers(self):
+        return len(self.targets)
+
+    @property
+    def total_segments(self):
+        return self.unique_numbers * self.segments
+
+    @property
+    def estimated_seconds(self):
+        # Gateway rate limits are counted in segments
+        return self.total_segments / self.send_rate if self.send_rate > 0 else 0.0
+
+    def preview(self):
+        return {
+            'recipients': self.total_recipients,
+            'unique_numbers': self.unique_numbers,
+            'duplicates': self.total_recipients - self.unique_numbers - len(self.invalid),
+            'invalid_numbers': len(self.invalid),
+            'encoding': self.encoding,
+            'characters': self.units,
+            'segments_per_message': self.segments,
+            'total_segments': self.total_segments,
+            'send_rate': self.send_rate,
+            'estimated_seconds': round(self.estimated_seconds, 1)
+        }
@@ -0,0 +1,274 @@
+"""
+Query-count check guarding against N+1 patterns.
+
+Seeds a throwaway SQLite database at two sizes, requests every route with
+the test client and counts the SQL statements each request issues. Exits
+non-zero if a route issues more statements on the larger database (its
+query count grows with the data), more than its budget, or answers with a
+server error (its count stops wherever it crashed). Pages that only fail
+because a template is missing, as in a checkout without templates/, are
+reported but still checked up to the point of rendering. POSTs run against
+the fake SMS gateway, so sending needs no provider.
+
+    python check_query_counts.py
+    python check_query_counts.py --small 10 --large 40 --budget 30
+
+Each size runs in a fresh interpreter so per-process caches do not carry
+over between databases.
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+DEFAULT_BUDGET = 25
+
+# Routes allowed more statements than the default budget
+BUDGETS = {
+    'POST /api/sync': 50,
+}
+
+# Routes that need arguments, or are left out entirely (None)
+REQUESTS = {
+    '/logout': None,
+    '/events': None,
+    '/export/<dataset>': ['/export/cases', '/export/environmental?format=ndjson', '/export/sms_history'],
+    '/api/regions/<int:region_id>': ['/api/regions/1'],
+    '/api/map/clusters': ['/api/map/clusters?zoom=5&bbox=85,20,100,30'],
+    '/api/map/heatmap': ['/api/map/heatmap?days=30&format=bin'],
+    '/api/symptoms/search': ['/api/symptoms/search?q=diarrhea+fever'],
+    '/api/symptoms/weekly': ['/api/symptoms/weekly?q=diarrhea'],
+    '/api/sms-history': ['/api/sms-history?limit=50'],
+}
+
+# Options may be callables of (run, village), village being the id of a seeded
+# location with recipients; each run posts something new so nothing is merged away
+POSTS = [
+    ('/api/classify', {'data': {'symptoms': 'watery diarrhea and vomiting'}}),
+    ('/send-sms-alert/preview', {'data': {'location_id': 'all', 'message': 'Boil drinking water'}}),
+    ('/api/sync', {'json': lambda run, village: {'reports': [
+        {'key': f'check-{run}-{i}', 'latitude': 26.0 + i / 100, 'longitude': 92.0, 'disease_id': 1, 'num_cases': 2}
+        for i in range(10)
+    ]}}),
+    ('/report', {'data': lambda run, village: {
+        'latitude': 27.0 + run / 100, 'longitude': 93.0, 'symptoms': 'watery diarrhea and vomiting', 'num_cases': 3
+    }}),
+    ('/admin/create_alert', {'data': lambda run, village: {
+        'location_id': str(village), 'severity': ['Low', 'High'][run], 'message': f'Check alert {run}'
+    }}),
+    ('/admin/add_environmental_data', {'data': lambda run, village: {
+        'location_id': village, 'ph': 7.2, 'turbidity': 4.0 + run, 'rainfall': 20, 'temperature': 26
+    }}),
+    ('/send-sms-alert', {'data': lambda run, village: {
+        'location_id': str(village), 'alert_type': 'prevention', 'message': f'Boil drinking water ({run})'
+    }}),
+    ('/admin/import_recipients', {'data': lambda run, village: {
+        'keep_missing': '1',
+        'file': (io.BytesIO(
+            f'name,phone_number,location_id\nImported {run},+91800000{run:04d},{village}\n'.encode()
+        ), 'recipients.csv')
+    }}),
+]
+
+ADMIN_PASSWORD = 'CheckQueries@123'
+SYMPTOMS = ['watery diarrhea', 'fever and jaundice', 'vomiting', 'abdominal cramps', 'bloody stool', 'fatigue']
+
+
+def seed(app, size):
+    """Add size locations with cases, readings, recipients, SMS history and alerts; returns the first one's id."""
+    from app import db
+    from app.models import Alert, Case, Disease, EnvironmentalData, Location, Recipient, SMSHistory, User
+    from app import counters, regions, risk, symptom_index
+
+    rng = random.Random(size)
+    now = datetime.now()
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        disease_ids = [disease.id for disease in Disease.query.all()]
+        state = regions.get_or_create('Check State', 'state')
+        district = regions.get_or_create('Check District', 'district', state)
+
+        locations = [
+            Location(name=f'Village {i}', latitude=20 + rng.random() * 8, longitude=88 + rng.random() * 8, region_id=district.id)
+            for i in range(size)
+        ]
+        db.session.add_all(locations)
+        db.session.flush()
+
+        db.session.bulk_insert_mappings(Case, [{
+            'disease_id': rng.choice(disease_ids),
+            'location_id': location.id,
+            'user_id': admin.id,
+            'case_date': now - timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23)),
+            'symptoms': rng.choice(SYMPTOMS),
+            'num_cases': rng.randint(1, 20)
+        } for location in locations for _ in range(5)])
+        db.session.bulk_insert_mappings(EnvironmentalData, [{
+            'location_id': location.id,
+            'timestamp': now - timedelta(days=rng.randint(0, 10)),
+            'rainfall': rng.uniform(0, 200),
+            'turbidity': rng.uniform(0, 20),
+            'ph': rng.uniform(6, 9),
+            'temperature': rng.uniform(18, 32)
+        } for location in locations])
+        db.session.bulk_insert_mappings(Alert, [{
+            'location_id': location.id,
+            'message': f'Check alert for {location.name}',
+            'severity': rng.choice(['Low', 'Medium', 'High']),
+            'created_by': admin.id
+        } for location in locations])
+        db.session.bulk_insert_mappings(Recipient, [{
+            'name': f'Recipient {location.id}-{i}',
+            'phone_number': f'+9190000{location.id:03d}{i:02d}',
+            'location_id': location.id,
+            'is_active': True
+        } for location in locations for i in range(3)])
+        db.session.commit()
+
+        recipient_ids = [recipient.id for recipient in Recipient.query.all()]
+        db.session.bulk_insert_mappings(SMSHistory, [{
+            'recipient_id': recipient_id,
+            'message': 'Boil drinking water before use',
+            'alert_type': 'prevention',
+            'status': rng.choice(['sent', 'delivered', 'failed']),
+            'sent_at': now - timedelta(hours=rng.randint(1, 500)),
+            'sent_by': admin.id
+        } for recipient_id in recipient_ids])
+        db.session.commit()
+
+        # Bulk inserts bypass the listeners that maintain these
+        counters.recount()
+        symptom_index.rebuild()
+        regions.rebuild()
+        risk.recompute()
+        return locations[0].id
+
+
+def import_package():
+    """Import this directory as the 'app' package, whatever the checkout is called."""
+    if 'app' in sys.modules:
+        return
+    here = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        'app', os.path.join(here, '__init__.py'), submodule_search_locations=[here]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['app'] = package
+    spec.loader.exec_module(package)
+
+
+def measure(size):
+    """Statement count per request against a database seeded with size locations."""
+    import_package()
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['ADMIN_PASSWORD'] = ADMIN_PASSWORD
+    os.environ['SMS_PROVIDER'] = 'fake'
+    os.environ['SMS_FAKE_LATENCY'] = '0'
+
+    from flask import got_request_exception
+    from sqlalchemy import event
+    from app import create_app, db
+
+    app = create_app()
+    village = seed(app, size)
+
+    statements = []
+    errors = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+    got_request_exception.connect(
+        lambda sender, exception, **extra: errors.append(type(exception).__name__), app, weak=False
+    )
+
+    targets = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or 'GET' not in rule.methods:
+            continue
+        urls = REQUESTS.get(rule.rule, [rule.rule] if not rule.arguments else None)
+        targets.extend(('GET', url, {}) for url in urls or [])
+    targets.extend(('POST', url, options) for url, options in POSTS)
+
+    counts = {}
+    with app.test_client() as client:
+        client.post('/login', data={'email': 'admin@aquarisk.org', 'password': ADMIN_PASSWORD})
+        for method, url, options in targets:
+            # The first request warms per-process caches; the second is counted
+            for run in range(2):
+                kwargs = {key: value(run, village) if callable(value) else value for key, value in options.items()}
+                del statements[:]
+                del errors[:]
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+            counts[f'{method} {url}'] = {
+                'statements': len(statements),
+                'status': response.status_code,
+                'error': errors[-1] if errors else None
+            }
+
+    os.remove(path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--small', type=int, default=10, help='Locations in the small database')
+    parser.add_argument('--large', type=int, default=40, help='Locations in the large database')
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET, help='Default statements allowed per request')
+    parser.add_argument('--measure', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return 0
+
+    results = {}
+    for size in (args.small, args.large):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', str(size)],
+            capture_output=True, text=True
+        )
+        if child.returncode:
+            print(child.stderr, file=sys.stderr)
+            print(f"❌ Measuring with {size} locations failed")
+            return 1
+        results[size] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    failures = 0
+    print(f"{'route':<55} {'small':>6} {'large':>6}  status")
+    for name, small in results[args.small].items():
+        large = results[args.large].get(name, small)
+        budget = BUDGETS.get(name, args.budget)
+        problems = []
+        if large['statements'] > small['statements']:
+            problems.append('grows with data')
+        if large['statements'] > budget:
+            problems.append(f'over budget ({budget})')
+        notes = []
+        for result in (small, large):
+            if result['status'] < 500:
+                continue
+            problem = f"HTTP {result['status']} {result['error'] or ''}".strip()
+            if result['error'] == 'TemplateNotFound':
+                notes.append('template missing')
+            elif problem not in problems:
+                problems.append(problem)
+        failures += bool(problems)
+        status = ', '.join(problems) or 'ok'
+        if notes:
+            status += f' ({notes[0]})'
+        print(f"{name:<55} {small['statements']:>6} {large['statements']:>6}  {status}")
+
+    print(f"\n{'❌' if failures else '✅'} {failures} route(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Symptom-to-disease classifier for unconfirmed case reports.
+
+Each disease gets a TF-IDF profile built from its description and the
+symptom terms of its confirmed cases (aggregated from the symptom index).
+Reports are scored by cosine similarity against every profile; batches are
+scored with NumPy scatter-adds so the backlog can be reclassified quickly,
+and the model is cached per process so single reports score without any
+database access.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Case, CaseClassification, Disease, SymptomPosting
+from . import reference
+from .symptom_index import tokenize
+
+# Placeholder disease for reports the reporter could not confirm
+UNCONFIRMED_DISEASE = 'Unconfirmed'
+UNCONFIRMED_DESCRIPTION = 'Reported illness awaiting diagnosis; a disease is suggested from the symptoms'
+
+# Best matches scoring below this are left unclassified
+MIN_SCORE = 0.05
+
+# How often (seconds) the cached model checks whether it needs a rebuild
+MODEL_CHECK_INTERVAL = 60
+
+# Extra weight given to the curated disease description over case reports
+DESCRIPTION_WEIGHT = 3
+
+
+class SymptomModel:
+    """TF-IDF disease profiles over a fixed vocabulary."""
+
+    def __init__(self, disease_ids, disease_names, vocabulary, weights, version):
+        self.disease_ids = disease_ids
+        self.disease_names = disease_names
+        self.vocabulary = vocabulary
+        # (terms x diseases), each disease column L2-normalized
+        self.weights = weights
+        self.version = version
+
+    @classmethod
+    def build(cls, version=None):
+        """Fit profiles from disease descriptions and confirmed cases."""
+        diseases = Disease.query.filter(Disease.name != UNCONFIRMED_DISEASE).order_by(Disease.id).all()
+        term_counts = {disease.id: Counter() for disease in diseases}
+
+        for disease in diseases:
+            for term in tokenize(f"{disease.name} {disease.description or ''}"):
+                term_counts[disease.id][term] += DESCRIPTION_WEIGHT
+
+        rows = db.session.query(
+            Case.disease_id,
+            SymptomPosting.term,
+            func.sum(SymptomPosting.term_count)
+        ).join(
+            Case, Case.id == SymptomPosting.case_id
+        ).filter(
+            Case.disease_id.in_(term_counts)
+        ).group_by(Case.disease_id, SymptomPosting.term).all()
+        for disease_id, term, count in rows:
+            term_counts[disease_id][term] += int(count or 0)
+
+        vocabulary = {}
+        for counts in term_counts.values():
+            for term in counts:
+                vocabulary.setdefault(term, len(vocabulary))
+
+        weights = np.zeros((len(vocabulary), len(diseases)), dtype=np.float32)
+        for column, disease in enumerate(diseases):
+            for term, count in term_counts[disease.id].items():
+                weights[vocabulary[term], column] = 1 + math.log(count)
+
+        # Terms shared by many diseases say little about any of them
+        document_frequency = (weights > 0).sum(axis=1)
+        weights *= (np.log((1 + len(diseases)) / (1 + document_frequency)) + 1)[:, None]
+        norms = np.linalg.norm(weights, axis=0)
+        weights /= np.where(norms > 0, norms, 1)
+
+        return cls(
+            [disease.id for disease in diseases],
+            [disease.name for disease in diseases],
+            vocabulary,
+            weights,
+            version
+        )
+
+    def score(self, text):
+        """Cosine similarity of one report against every disease."""
+        counts = Counter(term for term in tokenize(text) if term in self.vocabulary)
+        if not counts or not self.disease_ids:
+            return np.zeros(len(self.disease_ids), dtype=np.float32)
+        indexes = np.fromiter((self.vocabulary[term] for term in counts), dtype=np.int64)
+        values = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32))
+        return values @ self.weights[indexes] / np.linalg.norm(values)
+
+    def score_batch(self, texts):
+        """Cosine similarities for many reports, as a (reports x diseases) array."""
+        rows, indexes, values = [], [], []
+        for row, text in enumerate(texts):
+            for term, count in Counter(tokenize(text)).items():
+                index = self.vocabulary.get(term)
+                if index is not None:
+                    rows.append(row)
+                    indexes.append(index)
+                    values.append(1 + math.log(count))
+
+        scores = np.zeros((len(texts), len(self.disease_ids)), dtype=np.float32)
+        if not rows:
+            return scores
+        rows = np.array(rows)
+        values = np.array(values, dtype=np.float32)
+        np.add.at(scores, rows, self.weights[np.array(indexes)] * values[:, None])
+
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+        return scores / np.where(norms > 0, norms, 1)[:, None]
+
+    def best(self, scores):
+        """(disease_id, disease_name, score) of the top match, or Nones below MIN_SCORE."""
+        if not len(scores):
+            return None, None, 0.0
+        column = int(np.argmax(scores))
+        score = float(scores[column])
+        if score < MIN_SCORE:
+            return None, None, score
+        return self.disease_ids[column], self.disease_names[column], score
+
+
+_model = None
+_checked_at = 0
+_lock = threading.Lock()
+
+
+def _model_version():
+    """Changes whenever cases or diseases are added."""
+    return (
+        db.session.query(func.max(Case.id)).scalar() or 0,
+        db.session.query(func.count(Disease.id)).scalar() or 0
+    )
+
+
+def get_model():
+    """Cached model, rebuilt at most once per check interval when data changed."""
+    global _model, _checked_at
+    if _model is not None and time.time() - _checked_at < MODEL_CHECK_INTERVAL:
+        return _model
+
+    with _lock:
+        if _model is None or time.time() - _checked_at >= MODEL_CHECK_INTERVAL:
+            version = _model_version()
+            if _model is None or _model.version != version:
+                _model = SymptomModel.build(version)
+            _checked_at = time.time()
+    return _model
+
+
+def classify_text(text):
+    """Classify one symptom description."""
+    model = get_model()
+    scores = model.score(text)
+    disease_id, disease_name, score = model.best(scores)
+    ranked = sorted(zip(model.disease_names, scores.tolist()), key=lambda item: -item[1])
+    return {
+        'disease_id': disease_id,
+        'disease': disease_name,
+        'score': round(score, 4),
+        'scores': [{'disease': name, 'score': round(value, 4)} for name, value in ranked[:3]]
+    }
+
+
+def unconfirmed_disease_id():
+    """Id of the placeholder disease, created if this database predates it."""
+    row = reference.disease_named(UNCONFIRMED_DISEASE)
+    if row is not None:
+        return row.id
+    # Locking read: another worker may have just committed it
+    disease = Disease.query.filter_by(name=UNCONFIRMED_DISEASE).with_for_update().first()
+    if disease is None:
+        disease = Disease(name=UNCONFIRMED_DISEASE, description=UNCONFIRMED_DESCRIPTION)
+        try:
+            with db.session.begin_nested():
+                db.session.add(disease)
+        except IntegrityError:
+            disease = Disease.query.filter_by(name=UNCONFIRMED_DISEASE).with_for_update().one()
+    reference.bump('diseases')
+    return disease.id
+
+
+def save_classifications(results, version):
+    """Insert or replace suggested diseases from (case_id, disease_id, score) tuples."""
+    existing = {
+        classification.case_id: classification
+        for classification in CaseClassification.query.filter(
+            CaseClassification.case_id.in_([case_id for case_id, _, _ in results])
+        )
+    }
+    now = datetime.now()
+    for case_id, disease_id, score in results:
+        classification = existing.get(case_id)
+        if classification is None:
+            classification = CaseClassification(case_id=case_id)
+            db.session.add(classification)
+        classification.disease_id = disease_id
+        classification.score = score
+        classification.model_version = f"{version[0]}:{version[1]}"
+        classification.classified_at = now
+
+
+def reclassify_backlog(batch_size=500, include_confirmed=False):
+    """Score unconfirmed cases in batches; returns (scored, classified)."""
+    model = SymptomModel.build(_model_version())
+    query = db.session.query(Case.id, Case.symptoms)
+    if not include_confirmed:
+        query = query.join(Disease, Case.disease_id == Disease.id).filter(Disease.name == UNCONFIRMED_DISEASE)
+
+    scored = classified = 0
+    last_id = 0
+    while True:
+        # Keyset batches so each commit leaves no open cursor behind
+        batch = query.filter(Case.id > last_id).order_by(Case.id).limit(batch_size).all()
+        if not batch:
+            break
+        scores = model.score_batch([symptoms for _, symptoms in batch])
+        results = []
+        for (case_id, _), row in zip(batch, scores):
+            disease_id, _, score = model.best(row)
+            results.append((case_id, disease_id, score))
+            classified += disease_id is not None
+        save_classifications(results, model.version)
+        db.session.commit()
+        scored += len(batch)
+        last_id = batch[-1][0]
+    return scored, classified
@@ -0,0 +1,199 @@
+"""
+Server-side clustering of case locations for the map.
+
+Locations with cases are bucketed into a grid pyramid (one grid per zoom
+level, in Web Mercator space) so the map only receives the clusters that
+are visible for the current zoom and bounding box.
+"""
+import math
+import threading
+import time
+
+from sqlalchemy import func
+
+from .models import db, Case, Location
+
+# Deepest zoom level that is clustered; above it individual locations are returned
+MAX_ZOOM = 16
+
+# Cluster cell size in screen pixels (Leaflet tiles are 256px wide)
+CELL_PIXELS = 64
+
+# Full rebuild interval in seconds, to pick up deleted or edited cases
+REBUILD_INTERVAL = 600
+
+
+def _project(lat, lng):
+    """Project a lat/lng pair to Web Mercator coordinates in the 0..1 range."""
+    x = lng / 360.0 + 0.5
+    sin = math.sin(math.radians(lat))
+    sin = min(max(sin, -0.9999), 0.9999)
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+
+def _grid_size(zoom):
+    """Number of cells along one side of the grid at the given zoom."""
+    return (2 ** zoom) * (256 // CELL_PIXELS)
+
+
+class ClusterIndex:
+    """Grid pyramid over case locations with aggregated case counts."""
+
+    def __init__(self, max_zoom=MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # location_id -> [lat, lng, name, cases, x, y]
+        self.points = {}
+        # One dict per zoom: (cx, cy) -> [locations, cases, sum_lat, sum_lng, location_ids]
+        self.levels = [{} for _ in range(self.max_zoom + 1)]
+        self.last_case_id = 0
+        self.built_at = 0
+
+    def add_cases(self, location_id, lat, lng, name, num_cases):
+        """Fold new cases for a location into every zoom level."""
+        num_cases = num_cases or 0
+        point = self.points.get(location_id)
+        is_new = point is None
+        if is_new:
+            x, y = _project(lat, lng)
+            point = [lat, lng, name, 0, x, y]
+            self.points[location_id] = point
+        point[3] += num_cases
+
+        x, y = point[4], point[5]
+        for zoom, level in enumerate(self.levels):
+            size = _grid_size(zoom)
+            key = (min(int(x * size), size - 1), min(int(y * size), size - 1))
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = [0, 0, 0.0, 0.0, []]
+            if is_new:
+                cell[0] += 1
+                cell[2] += lat
+                cell[3] += lng
+                if zoom == self.max_zoom:
+                    cell[4].append(location_id)
+            cell[1] += num_cases
+
+    def rebuild(self):
+        """Build the index from scratch with one aggregate query."""
+        rows = db.session.query(
+            Location.id,
+            Location.latitude,
+            Location.longitude,
+            Location.name,
+            func.sum(Case.num_cases),
+            func.max(Case.id)
+        ).join(
+            Case, Case.location_id == Location.id
+        ).group_by(Location.id, Location.latitude, Location.longitude, Location.name).all()
+
+        self._reset()
+        for location_id, lat, lng, name, num_cases, max_case_id in rows:
+            self.add_cases(location_id, lat, lng, name, num_cases)
+            self.last_case_id = max(self.last_case_id, max_case_id or 0)
+        self.built_at = time.time()
+
+    def sync(self):
+        """Bring the index up to date with cases inserted since the last sync."""
+        if time.time() - self.built_at > REBUILD_INTERVAL:
+            self.rebuild()
+            return
+
+        rows = db.session.query(
+            Case.id,
+            Case.location_id,
+            Case.num_cases,
+            Location.latitude,
+            Location.longitude,
+            Location.name
+        ).join(
+            Location, Case.location_id == Location.id
+        ).filter(Case.id > self.last_case_id).order_by(Case.id).all()
+
+        for case_id, location_id, num_cases, lat, lng, name in rows:
+            self.add_cases(location_id, lat, lng, name, num_cases)
+            self.last_case_id = case_id
+
+    def _point_dict(self, location_id):
+        lat, lng, name, cases = self.points[location_id][:4]
+        return {
+            'id': location_id,
+            'lat': lat,
+            'lng': lng,
+            'name': name if name else f"Location at {lat:.4f}, {lng:.4f}",
+            'locations': 1,
+            'cases': cases
+        }
+
+    def _visible_cells(self, zoom, west, south, east, north):
+        """Yield the populated cells of a zoom level inside the bounding box."""
+        level = self.levels[zoom]
+        size = _grid_size(zoom)
+        x0, y0 = _project(north, west)
+        x1, y1 = _project(south, east)
+        cx0, cx1 = int(x0 * size), min(int(x1 * size), size - 1)
+        cy0, cy1 = int(y0 * size), min(int(y1 * size), size - 1)
+
+        # Walk whichever is smaller: the cells in view or the populated cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(level):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = level.get((cx, cy))
+                    if cell is not None:
+                        yield cell
+        else:
+            for (cx, cy), cell in level.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield cell
+
+    def query(self, zoom, west, south, east, north):
+        """Return the clusters visible at the given zoom within the bounding box."""
+        if west > east or south > north:
+            return []
+
+        if zoom > self.max_zoom:
+            points = []
+            for cell in self._visible_cells(self.max_zoom, west, south, east, north):
+                for location_id in cell[4]:
+                    lat, lng = self.points[location_id][:2]
+                    if south <= lat <= north and west <= lng <= east:
+                        points.append(self._point_dict(location_id))
+            return points
+
+        clusters = []
+        for cell in self._visible_cells(max(zoom, 0), west, south, east, north):
+            if cell[0] == 1:
+                # A cluster of one is reported as the location itself
+                location_id = self._single_location(cell)
+                if location_id is not None:
+                    clusters.append(self._point_dict(location_id))
+                    continue
+            clusters.append({
+                'lat': cell[2] / cell[0],
+                'lng': cell[3] / cell[0],
+                'locations': cell[0],
+                'cases': cell[1]
+            })
+        return clusters
+
+    def _single_location(self, cell):
+        """Find the location id behind a single-location cell."""
+        lat, lng = cell[2], cell[3]
+        x, y = _project(lat, lng)
+        size = _grid_size(self.max_zoom)
+        deepest = self.levels[self.max_zoom].get((min(int(x * size), size - 1), min(int(y * size), size - 1)))
+        return deepest[4][0] if deepest and len(deepest[4]) == 1 else None
+
+    def get_clusters(self, zoom, west, south, east, north):
+        """Sync with new cases and return the visible clusters."""
+        with self.lock:
+            self.sync()
+            return self.query(zoom, west, south, east, north)
+
+
+cluster_index = ClusterIndex()
@@ -0,0 +1,138 @@
+"""
+Incrementally maintained counters for the SMS statistics panel.
+
+Every flush that inserts, deletes or updates SMSHistory, Recipient or Alert
+rows adjusts the matching StatCounter rows in the same transaction, so the
+panel reads four precomputed values instead of counting whole tables.
+Bulk query deletes bypass the ORM, so counters are also recounted from the
+source tables periodically (and on demand via `flask recount-stats`).
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .models import db, Alert, ArchivedSMSHistory, Recipient, SMSHistory, StatCounter
+
+# Counters older than this are recounted the next time they are read
+RECOUNT_INTERVAL = timedelta(hours=6)
+
+COUNTER_QUERIES = {
+    # SMS totals cover archived history too
+    'sms_total': lambda: SMSHistory.query.count() + ArchivedSMSHistory.query.count(),
+    'sms_delivered': lambda: (
+        SMSHistory.query.filter_by(status='delivered').count()
+        + ArchivedSMSHistory.query.filter_by(status='delivered').count()
+    ),
+    'recipients_active': lambda: Recipient.query.filter_by(is_active=True).count(),
+    'alerts_total': lambda: Alert.query.count(),
+}
+
+
+def _old_and_new(obj, attribute):
+    """Previous and current value of an attribute changed in this flush."""
+    history = inspect(obj).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _row_deltas(obj, sign):
+    """Counter deltas for inserting (sign=1) or deleting (sign=-1) a row."""
+    deltas = Counter()
+    if isinstance(obj, SMSHistory):
+        deltas['sms_total'] += sign
+        if obj.status == 'delivered':
+            deltas['sms_delivered'] += sign
+    elif isinstance(obj, Recipient):
+        if obj.is_active is not False:
+            deltas['recipients_active'] += sign
+    elif isinstance(obj, Alert):
+        deltas['alerts_total'] += sign
+    return deltas
+
+
+def _update_deltas(obj):
+    """Counter deltas for an updated row."""
+    deltas = Counter()
+    if isinstance(obj, SMSHistory):
+        change = _old_and_new(obj, 'status')
+        if change:
+            deltas['sms_delivered'] += (change[1] == 'delivered') - (change[0] == 'delivered')
+    elif isinstance(obj, Recipient):
+        change = _old_and_new(obj, 'is_active')
+        if change:
+            deltas['recipients_active'] += (change[1] is not False) - (change[0] is not False)
+    return deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_counter_deltas(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        deltas.update(_row_deltas(obj, 1))
+    for obj in session.deleted:
+        deltas.update(_row_deltas(obj, -1))
+    for obj in session.dirty:
+        deltas.update(_update_deltas(obj))
+
+    # Counter.update() keeps zero and negative values, skip the no-ops
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    table = StatCounter.__table__
+    connection = session.connection()
+    for name, delta in deltas.items():
+        connection.execute(
+            table.update().where(table.c.name == name).values(value=table.c.value + delta)
+        )
+
+
+def bump(name, delta):
+    """Adjust a counter inside the current transaction (for bulk writes)."""
+    if not delta:
+        return
+    table = StatCounter.__table__
+    db.session.execute(
+        table.update().where(table.c.name == name).values(value=table.c.value + delta)
+    )
+
+
+def recount():
+    """Recompute every counter from its source table."""
+    now = datetime.now()
+    for name, count_query in COUNTER_QUERIES.items():
+        counter = StatCounter.query.get(name)
+        if counter is None:
+            counter = StatCounter(name=name)
+            db.session.add(counter)
+        counter.value = count_query()
+        counter.recounted_at = now
+    db.session.commit()
+
+
+def _load_counters():
+    return {
+        counter.name: counter
+        for counter in StatCounter.query.filter(StatCounter.name.in_(COUNTER_QUERIES))
+    }
+
+
+def get_stats():
+    """Current counter values, recounting if they are missing or stale."""
+    # stat_counter also holds other rows (lookup cache versions); only these are recounted
+    counters = _load_counters()
+    stale_before = datetime.now() - RECOUNT_INTERVAL
+
+    if set(COUNTER_QUERIES) - set(counters) or any(
+        counter.recounted_at is None or counter.recounted_at < stale_before
+        for counter in counters.values()
+    ):
+        recount()
+        counters = _load_counters()
+
+    return {name: counters[name].value for name in COUNTER_QUERIES}
@@ -0,0 +1,167 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with yield_per (a server-side cursor where the driver supports
+it) and encoded in small chunks, so an export starts sending bytes at once
+and uses constant memory however many rows it covers.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from .models import (db, ArchivedCase, ArchivedSMSHistory, Case, Disease, EnvironmentalData,
+                     Location, Recipient, SMSHistory)
+
+# Rows fetched per round trip and encoded per output chunk
+BATCH_SIZE = 1000
+
+
+def _case_query(filters, model=Case):
+    query = db.session.query(
+        model.id,
+        model.case_date,
+        Disease.name.label('disease'),
+        Location.name.label('location'),
+        Location.latitude,
+        Location.longitude,
+        model.num_cases,
+        model.symptoms
+    ).join(
+        Disease, model.disease_id == Disease.id
+    ).join(
+        Location, model.location_id == Location.id
+    )
+    if filters.get('disease_id'):
+        query = query.filter(model.disease_id == filters['disease_id'])
+    if filters.get('location_id'):
+        query = query.filter(model.location_id == filters['location_id'])
+    return _date_range(query, model.case_date, filters).order_by(model.id)
+
+
+def _environmental_query(filters):
+    query = db.session.query(
+        EnvironmentalData.id,
+        EnvironmentalData.timestamp,
+        Location.name.label('location'),
+        Location.latitude,
+        Location.longitude,
+        EnvironmentalData.rainfall,
+        EnvironmentalData.turbidity,
+        EnvironmentalData.ph,
+        EnvironmentalData.temperature
+    ).join(
+        Location, EnvironmentalData.location_id == Location.id
+    )
+    if filters.get('location_id'):
+        query = query.filter(EnvironmentalData.location_id == filters['location_id'])
+    return _date_range(query, EnvironmentalData.timestamp, filters).order_by(EnvironmentalData.id)
+
+
+def _sms_history_query(filters, model=SMSHistory):
+    query = db.session.query(
+        model.id,
+        model.sent_at,
+        model.status,
+        model.alert_type,
+        Recipient.name.label('recipient'),
+        Recipient.phone_number,
+        Location.name.label('location'),
+        model.message
+    ).join(
+        Recipient, model.recipient_id == Recipient.id
+    ).join(
+        Location, Recipient.location_id == Location.id
+    )
+    if filters.get('location_id'):
+        query = query.filter(Recipient.location_id == filters['location_id'])
+    return _date_range(query, model.sent_at, filters).order_by(model.id)
+
+
+def _date_range(query, column, filters):
+    if filters.get('since'):
+        query = query.filter(column >= filters['since'])
+    if filters.get('until'):
+        # Inclusive of the whole 'until' day
+        query = query.filter(column < filters['until'] + timedelta(days=1))
+    return query
+
+
+DATASETS = {
+    'cases': _case_query,
+    'environmental': _environmental_query,
+    'sms_history': _sms_history_query,
+}
+
+# Archive tables that can be included on request (see archive.py)
+ARCHIVED_MODELS = {
+    'cases': ArchivedCase,
+    'sms_history': ArchivedSMSHistory,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(dataset, filters, include_archived=False):
+    """Return (columns, row_iterator) for a dataset with streaming enabled."""
+    query = DATASETS[dataset](filters)
+    columns = [column['name'] for column in query.column_descriptions]
+
+    def rows():
+        # Archived rows are older, so they come first
+        if include_archived and dataset in ARCHIVED_MODELS:
+            yield from DATASETS[dataset](filters, ARCHIVED_MODELS[dataset]).yield_per(BATCH_SIZE)
+        yield from query.yield_per(BATCH_SIZE)
+
+    return columns, rows()
+
+
+def _csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_value(value) for value in row])
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, (_value(value) for value in row))), ensure_ascii=False))
+        if len(lines) >= BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(dataset, output_format='csv', filters=None, compress=False, include_archived=False):
+    """Generator of encoded export bytes."""
+    columns, rows = iter_rows(dataset, filters or {}, include_archived)
+    encode = _csv_chunks if output_format == 'csv' else _ndjson_chunks
+    chunks = (text.encode('utf-8') for text in encode(columns, rows) if text)
+    return _gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,209 @@
+"""
+Short-term case forecasts per location and disease.
+
+Daily case counts for every location x disease series are loaded with one
+grouped query and fitted together with damped Holt (level + trend)
+exponential smoothing: the recursion runs once per day across all series
+as NumPy vectors, for each candidate smoothing pair, and each series keeps
+the pair with the lowest one-step-ahead error. A fingerprint of each
+series' inputs is stored with its forecast, so a run refits only the
+series that received new, edited or expired cases (or whose forecast is
+getting old) and the nightly cost follows the changes, not the number of
+locations.
+
+Forecasts over several series add their expected counts and combine their
+intervals by variance: series are treated as independent, so the aggregate
+half-width is the root of the summed squared half-widths rather than their
+sum.
+"""
+import math
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, tuple_
+
+from .models import db, Case, CaseForecast, ForecastState
+
+# Days of history each series is fitted on
+HISTORY_DAYS = 56
+
+DEFAULT_HORIZON = 14
+
+# Forecasts older than this are refitted even without new cases
+REFIT_AFTER = timedelta(days=3)
+
+# Candidate (alpha, beta) smoothing pairs and the trend damping factor
+ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7])
+BETAS = np.array([0.05, 0.1, 0.2])
+PHI = 0.9
+
+# z for an approximate 90% interval
+INTERVAL_Z = 1.645
+
+# Series written per transaction
+BATCH_SIZE = 500
+
+
+def load_series(start, end):
+    """Daily counts per series as (keys, counts[series, day], fingerprints)."""
+    day = func.date(Case.case_date)
+    rows = db.session.query(
+        Case.location_id,
+        Case.disease_id,
+        day,
+        func.sum(Case.num_cases),
+        func.count(Case.id),
+        func.max(Case.id)
+    ).filter(
+        Case.case_date >= start,
+        Case.case_date < end
+    ).group_by(Case.location_id, Case.disease_id, day).all()
+
+    index, totals = {}, {}
+    cells = []
+    for location_id, disease_id, case_day, cases, reports, last_id in rows:
+        if isinstance(case_day, str):
+            case_day = date.fromisoformat(case_day)
+        key = (location_id, disease_id)
+        row = index.setdefault(key, len(index))
+        cells.append((row, (case_day - start.date()).days, int(cases or 0)))
+        cases_sum, reports_sum, max_id = totals.get(key, (0, 0, 0))
+        totals[key] = (cases_sum + int(cases or 0), reports_sum + reports, max(max_id, last_id))
+
+    counts = np.zeros((len(index), (end - start).days), dtype=np.float64)
+    if cells:
+        series_rows, columns, values = np.array(cells).T
+        np.add.at(counts, (series_rows, columns), values)
+
+    keys = list(index)
+    # Any new, edited, deleted or expired case changes one of these
+    fingerprints = ["{}:{}:{}".format(*totals[key]) for key in keys]
+    return keys, counts, fingerprints
+
+
+def fit_holt(counts):
+    """Fit damped Holt smoothing to every row; returns (level, trend, sigma)."""
+    series, days = counts.shape
+    best_error = np.full(series, np.inf)
+    best_level = np.zeros(series)
+    best_trend = np.zeros(series)
+
+    for alpha in ALPHAS:
+        for beta in BETAS:
+            level = counts[:, 0].copy()
+            trend = np.zeros(series)
+            error = np.zeros(series)
+            for day in range(1, days):
+                predicted = level + PHI * trend
+                error += (counts[:, day] - predicted) ** 2
+                new_level = alpha * counts[:, day] + (1 - alpha) * predicted
+                trend = beta * (new_level - level) + (1 - beta) * PHI * trend
+                level = new_level
+            better = error < best_error
+            best_error = np.where(better, error, best_error)
+            best_level = np.where(better, level, best_level)
+            best_trend = np.where(better, trend, best_trend)
+
+    sigma = np.sqrt(best_error / max(days - 1, 1))
+    return best_level, best_trend, sigma
+
+
+def project(level, trend, sigma, horizon):
+    """(expected, lower, upper) arrays of shape [series, horizon]."""
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(PHI ** steps)
+    expected = np.maximum(level[:, None] + trend[:, None] * damping[None, :], 0)
+    spread = INTERVAL_Z * sigma[:, None] * np.sqrt(steps)[None, :]
+    return expected, np.maximum(expected - spread, 0), expected + spread
+
+
+def _delete_series(keys):
+    for start in range(0, len(keys), BATCH_SIZE):
+        chunk = keys[start:start + BATCH_SIZE]
+        for model in (CaseForecast, ForecastState):
+            model.query.filter(
+                tuple_(model.location_id, model.disease_id).in_(chunk)
+            ).delete(synchronize_session=False)
+
+
+def run_forecasts(horizon=DEFAULT_HORIZON, refit_all=False, now=None):
+    """Refit changed series and store their forecasts; returns a summary dict."""
+    now = now or datetime.now()
+    today = datetime.combine(now.date(), datetime.min.time())
+    start = today - timedelta(days=HISTORY_DAYS)
+    keys, counts, fingerprints = load_series(start, today)
+
+    states = {(state.location_id, state.disease_id): state for state in ForecastState.query.all()}
+    stale_before = now - REFIT_AFTER
+    changed = [
+        row for row, key in enumerate(keys)
+        if refit_all or key not in states
+        or states[key].fingerprint != fingerprints[row]
+        or states[key].fitted_at < stale_before
+    ]
+
+    # Series without cases in the history window no longer get a forecast
+    dropped = list(set(states) - set(keys))
+    _delete_series(dropped)
+
+    for batch_start in range(0, len(changed), BATCH_SIZE):
+        rows = changed[batch_start:batch_start + BATCH_SIZE]
+        batch_keys = [keys[row] for row in rows]
+        expected, lower, upper = project(*fit_holt(counts[rows]), horizon)
+
+        CaseForecast.query.filter(
+            tuple_(CaseForecast.location_id, CaseForecast.disease_id).in_(batch_keys)
+        ).delete(synchronize_session=False)
+        forecasts = []
+        for position, (location_id, disease_id) in enumerate(batch_keys):
+            for step in range(horizon):
+                forecasts.append({
+                    'location_id': location_id,
+                    'disease_id': disease_id,
+                    'forecast_date': (today + timedelta(days=step)).date(),
+                    'expected': round(float(expected[position, step]), 2),
+                    'lower': round(float(lower[position, step]), 2),
+                    'upper': round(float(upper[position, step]), 2),
+                    'generated_at': now
+                })
+        db.session.bulk_insert_mappings(CaseForecast, forecasts)
+
+        for row, key in zip(rows, batch_keys):
+            state = states.get(key)
+            if state is None:
+                state = ForecastState(location_id=key[0], disease_id=key[1])
+                db.session.add(state)
+            state.fingerprint = fingerprints[row]
+            state.fitted_at = now
+        db.session.commit()
+
+    db.session.commit()
+    return {'series': len(keys), 'refitted': len(changed), 'dropped': len(dropped)}
+
+
+def forecasts_for(location_id=None, disease_id=None, days=DEFAULT_HORIZON):
+    """Stored forecasts from today on, summed over the unselected dimension.
+
+    Returns (forecast_date, expected, lower, upper) rows. The upper bound is
+    stored unclipped, so upper - expected is each series' half-width.
+    """
+    today = date.today()
+    half_width = CaseForecast.upper - CaseForecast.expected
+    query = db.session.query(
+        CaseForecast.forecast_date,
+        func.sum(CaseForecast.expected),
+        func.sum(half_width * half_width)
+    ).filter(
+        CaseForecast.forecast_date >= today,
+        CaseForecast.forecast_date < today + timedelta(days=days)
+    )
+    if location_id:
+        query = query.filter(CaseForecast.location_id == location_id)
+    if disease_id:
+        query = query.filter(CaseForecast.disease_id == disease_id)
+    rows = query.group_by(CaseForecast.forecast_date).order_by(CaseForecast.forecast_date).all()
+    forecasts = []
+    for forecast_date, expected, squared_widths in rows:
+        spread = math.sqrt(squared_widths or 0)
+        forecasts.append((forecast_date, expected, max(expected - spread, 0), expected + spread))
+    return forecasts
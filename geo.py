@@ -0,0 +1,135 @@
+"""
+Geographic targeting helpers for SMS broadcasts.
+
+Candidate locations are found with a bounding-box query on the indexed
+latitude/longitude columns and then filtered exactly with vectorized
+haversine distance or point-in-polygon tests.
+"""
+import json
+import math
+
+import numpy as np
+
+from .models import db, Location, Recipient
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Largest broadcast radius accepted from the form
+MAX_RADIUS_KM = 500
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def radius_bounds(lat, lng, radius_km):
+    """Bounding box (south, west, north, east) enclosing a circle."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if south <= -90.0 or north >= 90.0:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    return south, max(lng - dlng, -180.0), north, min(lng + dlng, 180.0)
+
+
+def points_in_polygon(lats, lngs, polygon):
+    """Ray-casting test of arrays of points against a [(lat, lng), ...] polygon."""
+    inside = np.zeros(len(lats), dtype=bool)
+    count = len(polygon)
+    for i in range(count):
+        lat1, lng1 = polygon[i]
+        lat2, lng2 = polygon[(i + 1) % count]
+        if lat1 == lat2:
+            continue
+        crosses = (lats > min(lat1, lat2)) & (lats <= max(lat1, lat2))
+        lng_at = lng1 + (lats - lat1) * (lng2 - lng1) / (lat2 - lat1)
+        inside ^= crosses & (lngs < lng_at)
+    return inside
+
+
+def _candidates(south, west, north, east):
+    """Locations inside a bounding box as (ids, lats, lngs) arrays."""
+    rows = db.session.query(
+        Location.id,
+        Location.latitude,
+        Location.longitude
+    ).filter(
+        Location.latitude.between(south, north),
+        Location.longitude.between(west, east)
+    ).all()
+
+    if not rows:
+        empty = np.zeros(0)
+        return empty.astype(int), empty, empty
+    data = np.array(rows, dtype=float)
+    return data[:, 0].astype(int), data[:, 1], data[:, 2]
+
+
+def locations_within_radius(lat, lng, radius_km):
+    """Ids of locations within radius_km of a point."""
+    ids, lats, lngs = _candidates(*radius_bounds(lat, lng, radius_km))
+    if not len(ids):
+        return []
+    return ids[haversine_km(lat, lng, lats, lngs) <= radius_km].tolist()
+
+
+def locations_in_polygon(polygon):
+    """Ids of locations inside a [(lat, lng), ...] polygon."""
+    polygon_lats = [point[0] for point in polygon]
+    polygon_lngs = [point[1] for point in polygon]
+    ids, lats, lngs = _candidates(min(polygon_lats), min(polygon_lngs), max(polygon_lats), max(polygon_lngs))
+    if not len(ids):
+        return []
+    return ids[points_in_polygon(lats, lngs, polygon)].tolist()
+
+
+def recipients_for_locations(location_ids):
+    """Active recipients registered at any of the given locations."""
+    if not location_ids:
+        return []
+    return Recipient.query.filter(
+        Recipient.location_id.in_(location_ids),
+        Recipient.is_active == True
+    ).all()
+
+
+def resolve_target_locations(target, form):
+    """Resolve a 'radius' or 'polygon' broadcast target from form fields.
+
+    Returns (location_ids, description); raises ValueError on bad input.
+    """
+    if target == 'radius':
+        center = None
+        try:
+            radius_km = float(form.get('radius_km', ''))
+            if form.get('center_location_id'):
+                center = Location.query.get(int(form.get('center_location_id')))
+            else:
+                lat, lng = float(form.get('center_lat', '')), float(form.get('center_lng', ''))
+                label = f"{lat:.4f}, {lng:.4f}"
+        except (TypeError, ValueError):
+            raise ValueError('A center and radius_km are required for radius targeting.')
+
+        if form.get('center_location_id'):
+            if not center:
+                raise ValueError('Center location not found.')
+            lat, lng, label = center.latitude, center.longitude, center.name
+
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}.')
+        return locations_within_radius(lat, lng, radius_km), f"{radius_km:g} km around {label}"
+
+    if target == 'polygon':
+        try:
+            polygon = [(float(lat), float(lng)) for lat, lng in json.loads(form.get('polygon', ''))]
+        except (TypeError, ValueError):
+            raise ValueError('polygon must be a JSON list of [lat, lng] pairs.')
+        if len(polygon) < 3:
+            raise ValueError('polygon needs at least three points.')
+        return locations_in_polygon(polygon), 'Selected area'
+
+    raise ValueError(f'Unknown target: {target}')
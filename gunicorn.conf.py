@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration for AquaRisk Monitor.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden through the environment variables below.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# gthread lets one worker serve several requests while others wait on MySQL
+# or the SMS gateway; sync is the safer choice for CPU-bound workloads.
+# Open live update streams (/events) each hold an idle thread, so a worker
+# runs enough threads for a dozen streams besides its page traffic.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '16')) if worker_class == 'gthread' else 1
+
+_cpus = multiprocessing.cpu_count()
+workers = int(os.environ.get('GUNICORN_WORKERS', _cpus + 1 if worker_class == 'gthread' else _cpus * 2 + 1))
+
+# Run create_app() (table checks, default data) once in the master
+preload_app = True
+
+# SMS broadcasts send one request per recipient and can run for minutes
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '60'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers now and then to bound memory growth from caches
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the preloaded master."""
+    from app import db
+
+    # With preload_app the master has already loaded the Flask app
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def when_ready(server):
+    """Compile templates in the master so forked workers start with them loaded."""
+    from app import templating
+
+    count = templating.warm(server.app.wsgi())
+    server.log.info("Compiled %d templates", count)
@@ -0,0 +1,168 @@
+"""
+Case-density heatmap rasters for the map.
+
+Case counts are aggregated per location in SQL, binned onto a lat/lng grid,
+smoothed with a separable Gaussian kernel and encoded as an 8-bit grayscale
+PNG (or a gzipped raw byte grid) that the map can draw as an image overlay.
+"""
+import gzip
+import math
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from .models import db, Case, Location
+
+# Raster cell size in screen pixels at the requested zoom
+CELL_PIXELS = 4
+
+# Gaussian kernel width in cells
+SIGMA_CELLS = 3.0
+
+# Upper bound on cells along either side of the raster
+MAX_CELLS = 512
+
+MAX_ZOOM = 14
+
+# Cached rasters expire after this many seconds even if no cases arrived
+CACHE_TTL = 300
+CACHE_SIZE = 64
+
+
+def gaussian_smooth(grid, sigma=SIGMA_CELLS):
+    """Smooth a 2D grid with a separable Gaussian kernel."""
+    radius = max(1, int(math.ceil(3 * sigma)))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    for _ in range(2):
+        # Convolve along axis 0, then transpose so the next pass covers axis 1
+        rows = grid.shape[0]
+        padded = np.pad(grid, ((radius, radius), (0, 0)))
+        smoothed = np.zeros_like(grid)
+        for start, weight in enumerate(kernel):
+            smoothed += weight * padded[start:start + rows]
+        grid = smoothed.T
+    return grid
+
+
+def encode_png(pixels):
+    """Encode a 2D uint8 array as a grayscale PNG."""
+    height, width = pixels.shape
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    # Every scanline starts with filter type 0 (none)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), pixels]).tobytes()
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw, 9))
+        + chunk(b'IEND', b'')
+    )
+
+
+def _case_totals(disease_id=None, days=None):
+    """Total cases per location as (latitudes, longitudes, cases) arrays."""
+    query = db.session.query(
+        Location.latitude,
+        Location.longitude,
+        func.sum(Case.num_cases)
+    ).join(
+        Case, Case.location_id == Location.id
+    )
+    if disease_id:
+        query = query.filter(Case.disease_id == disease_id)
+    if days:
+        query = query.filter(Case.case_date >= datetime.now() - timedelta(days=days))
+    rows = query.group_by(Location.id, Location.latitude, Location.longitude).all()
+
+    if not rows:
+        empty = np.zeros(0)
+        return empty, empty, empty
+    data = np.array([(lat, lng, cases or 0) for lat, lng, cases in rows], dtype=float)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def build_heatmap(disease_id=None, days=None, zoom=6):
+    """Build the smoothed raster and its encodings for one (disease, window, zoom)."""
+    lats, lngs, cases = _case_totals(disease_id, days)
+    cell = 360.0 / (256 * 2 ** zoom) * CELL_PIXELS
+    margin = cell * SIGMA_CELLS * 3
+
+    if len(lats):
+        south, north = lats.min() - margin, lats.max() + margin
+        west, east = lngs.min() - margin, lngs.max() + margin
+    else:
+        south = north = west = east = 0.0
+
+    # Coarsen the cells rather than exceed the raster size limit
+    cell = max(cell, (north - south) / MAX_CELLS, (east - west) / MAX_CELLS)
+    rows = max(1, int(math.ceil((north - south) / cell)))
+    cols = max(1, int(math.ceil((east - west) / cell)))
+    north, east = south + rows * cell, west + cols * cell
+
+    grid, _, _ = np.histogram2d(
+        lats, lngs,
+        bins=[rows, cols],
+        range=[[south, north], [west, east]],
+        weights=cases
+    )
+    grid = gaussian_smooth(grid)
+
+    # Image rows run north to south
+    grid = grid[::-1]
+    peak = float(grid.max()) if grid.size else 0.0
+    pixels = np.zeros(grid.shape, dtype=np.uint8) if peak <= 0 else np.round(grid / peak * 255).astype(np.uint8)
+
+    return {
+        'bounds': [south, west, north, east],
+        'width': cols,
+        'height': rows,
+        'peak': peak,
+        'png': encode_png(pixels),
+        'bin': gzip.compress(pixels.tobytes())
+    }
+
+
+class HeatmapCache:
+    """LRU cache of heatmap rasters keyed by (disease, window, zoom)."""
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, disease_id=None, days=None, zoom=6):
+        zoom = min(max(zoom, 0), MAX_ZOOM)
+        key = (disease_id, days, zoom)
+        # New cases invalidate every cached raster
+        watermark = db.session.query(func.max(Case.id)).scalar() or 0
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == watermark and time.time() - entry[1] < self.ttl:
+                self.entries.move_to_end(key)
+                return entry[2]
+
+        heatmap = build_heatmap(disease_id, days, zoom)
+
+        with self.lock:
+            self.entries[key] = (watermark, time.time(), heatmap)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return heatmap
+
+
+heatmap_cache = HeatmapCache()
@@ -0,0 +1,91 @@
+"""
+Keyset-paginated, filterable SMS history queries.
+
+Pages are ordered by (sent_at, id) descending and continue from an opaque
+cursor holding the last row's key, so every page is an index range scan
+regardless of how far back it is. Rows without a sent_at have no place in
+that order and are not listed.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+
+from .models import db, Location, Recipient, SMSHistory
+from .broadcast import normalize_phone
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sent_at, row_id):
+    raw = f"{sent_at.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (sent_at, id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        sent_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(sent_at), int(row_id)
+    except (UnicodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def _search_filter(search):
+    """Full-text match on MySQL, case-insensitive substring match elsewhere."""
+    if db.engine.dialect.name == 'mysql':
+        return SMSHistory.message.match(search)
+    return func.lower(SMSHistory.message).contains(search.lower(), autoescape=True)
+
+
+def query_sms_history(cursor=None, limit=DEFAULT_PAGE_SIZE, status=None, alert_type=None,
+                      location_id=None, phone=None, search=None):
+    """Return (rows, next_cursor) for one page of SMS history, newest first."""
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+
+    query = db.session.query(
+        SMSHistory.id,
+        SMSHistory.message,
+        SMSHistory.alert_type,
+        SMSHistory.status,
+        SMSHistory.sent_at,
+        Recipient.name.label('recipient_name'),
+        Recipient.phone_number,
+        Location.name.label('location_name')
+    ).join(
+        Recipient, SMSHistory.recipient_id == Recipient.id
+    ).join(
+        Location, Recipient.location_id == Location.id
+    ).filter(
+        SMSHistory.sent_at.isnot(None)
+    )
+
+    if status:
+        query = query.filter(SMSHistory.status == status)
+    if alert_type:
+        query = query.filter(SMSHistory.alert_type == alert_type)
+    if location_id:
+        query = query.filter(Recipient.location_id == location_id)
+    if phone:
+        # Older rows may hold numbers as typed rather than normalized
+        numbers = {phone.strip(), normalize_phone(phone) or phone.strip()}
+        query = query.filter(Recipient.phone_number.in_(numbers))
+    if search:
+        query = query.filter(_search_filter(search))
+
+    if cursor:
+        sent_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            SMSHistory.sent_at < sent_at,
+            and_(SMSHistory.sent_at == sent_at, SMSHistory.id < row_id)
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(SMSHistory.sent_at.desc(), SMSHistory.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sent_at, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,270 @@
+"""
+Live updates for the dashboard and map over Server-Sent Events.
+
+Inserting a Case, Alert or EnvironmentalData row (or escalating an Alert)
+records it on the session; once the transaction commits, the worker's hub
+is nudged and publishes the rows to its subscribers at once. Each worker's
+hub also polls the tables on an id watermark every few seconds, plus
+alerts whose alert_date moved recently (escalations update in place), so
+rows committed by other gunicorn workers (or scripts) reach every stream
+too. Rows are loaded with one joined query per table and sent as compact
+JSON deltas.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session, object_session
+
+from .models import db, Alert, Case, Disease, EnvironmentalData, Location, LocationRisk
+
+# Seconds between polls for rows committed by other processes
+POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', '2'))
+
+# Ids re-checked below the watermark, for rows that commit out of id order
+LOOKBACK_IDS = 100
+
+# Rows changed in place within this long are re-checked, for slow commits
+CHANGE_LOOKBACK = timedelta(seconds=60)
+
+# Ids remembered per table so re-checked rows are not sent twice
+SEEN_IDS = 5000
+
+# Events buffered per subscriber before the oldest are dropped
+QUEUE_SIZE = 100
+
+# Threads per worker kept for pages; each open stream holds one of the rest
+# (gunicorn.conf.py runs 16 threads by default)
+PAGE_THREADS = 4
+MAX_STREAMS = int(os.environ.get(
+    'LIVE_MAX_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', '16')) - PAGE_THREADS)
+))
+
+# A sync gunicorn worker would be tied up (and killed at its timeout) by one stream
+STREAMS_ENABLED = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread') != 'sync'
+
+# Seconds a stream stays open before the client reconnects; kept well inside
+# gunicorn's worker timeout (gunicorn.conf.py reads the same variable)
+STREAM_LIFETIME = max(30, min(300, int(os.environ.get('GUNICORN_TIMEOUT', '180')) - 30))
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _case_events(rows):
+    return [{
+        'type': 'case',
+        'id': case_row.id,
+        'disease': disease_name,
+        'location_id': location.id,
+        'name': location.name,
+        'lat': location.latitude,
+        'lng': location.longitude,
+        'cases': case_row.num_cases,
+        'risk': score,
+        'date': _timestamp(case_row.case_date)
+    } for case_row, disease_name, location, score in rows]
+
+
+def _alert_events(rows):
+    return [{
+        'type': 'alert',
+        'id': alert.id,
+        'location_id': location.id,
+        'name': location.name,
+        'severity': alert.severity,
+        'message': alert.message[:200],
+        'date': _timestamp(alert.alert_date)
+    } for alert, location, _ in rows]
+
+
+def _environmental_events(rows):
+    return [{
+        'type': 'environmental',
+        'id': reading.id,
+        'location_id': location.id,
+        'name': location.name,
+        'ph': reading.ph,
+        'turbidity': reading.turbidity,
+        'rainfall': reading.rainfall,
+        'temperature': reading.temperature,
+        'risk': score,
+        'date': _timestamp(reading.timestamp)
+    } for reading, location, score in rows]
+
+
+def _case_query():
+    return db.session.query(Case, Disease.name, Location, LocationRisk.score).join(
+        Disease, Case.disease_id == Disease.id
+    ).join(
+        Location, Case.location_id == Location.id
+    )
+
+
+def _alert_query():
+    return db.session.query(Alert, Location, LocationRisk.score).join(
+        Location, Alert.location_id == Location.id
+    )
+
+
+def _environmental_query():
+    return db.session.query(EnvironmentalData, Location, LocationRisk.score).join(
+        Location, EnvironmentalData.location_id == Location.id
+    )
+
+
+# kind -> (model, joined row query, event builder, column moved when a row changes in place)
+SOURCES = {
+    'case': (Case, _case_query, _case_events, None),
+    'alert': (Alert, _alert_query, _alert_events, Alert.alert_date),
+    'environmental': (EnvironmentalData, _environmental_query, _environmental_events, None),
+}
+
+
+class LiveHub:
+    """Per-process publish/subscribe hub with a polling thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._app = None
+        self._watermarks = {}
+        self._changed_since = None
+        self._seen = {kind: OrderedDict() for kind in SOURCES}
+
+    def subscribe(self, app, kinds):
+        """Queue receiving events of the given kinds, or None when streams are full."""
+        with self._lock:
+            if len(self._subscribers) >= MAX_STREAMS:
+                return None
+            subscriber = queue.Queue(QUEUE_SIZE)
+            self._subscribers[subscriber] = set(kinds)
+            if self._thread is None:
+                self._app = app
+                self._thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def notify(self):
+        """Poll now instead of waiting for the next interval."""
+        self._wakeup.set()
+
+    def publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for subscriber, kinds in subscribers:
+            for live_event in events:
+                if live_event['type'] not in kinds:
+                    continue
+                try:
+                    subscriber.put_nowait(live_event)
+                except queue.Full:
+                    # A slow client loses its oldest events rather than blocking the hub
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+                    subscriber.put_nowait(live_event)
+
+    def _run(self):
+        with self._app.app_context():
+            # Only rows committed after the first subscriber connected are streamed
+            self._changed_since = datetime.now()
+            for kind, (model, _, _, changed) in SOURCES.items():
+                watermark = db.session.query(func.max(model.id)).scalar() or 0
+                self._watermarks[kind] = watermark
+                columns = (model.id,) if changed is None else (model.id, changed)
+                for row in db.session.query(*columns).filter(self._recent(kind, model, changed)):
+                    self._seen[kind][row[0] if changed is None else tuple(row)] = True
+            db.session.remove()
+
+        while True:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                with self._app.app_context():
+                    self.poll()
+            except Exception as e:
+                print(f"⚠️ Live update poll failed: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def _recent(self, kind, model, changed):
+        """Rows above the watermark minus the lookback, or changed in place lately."""
+        recent = model.id > self._watermarks[kind] - LOOKBACK_IDS
+        if changed is not None:
+            recent = or_(recent, changed >= self._changed_since - CHANGE_LOOKBACK)
+        return recent
+
+    def poll(self):
+        """Publish recent rows (see _recent) not yet sent."""
+        started = datetime.now()
+        for kind, (model, query, build, changed) in SOURCES.items():
+            rows = query().outerjoin(
+                LocationRisk, LocationRisk.location_id == model.location_id
+            ).filter(
+                self._recent(kind, model, changed)
+            ).order_by(model.id).limit(500).all()
+
+            seen = self._seen[kind]
+            fresh = []
+            for row in rows:
+                obj = row[0]
+                key = obj.id if changed is None else (obj.id, getattr(obj, changed.key))
+                if key in seen:
+                    continue
+                seen[key] = True
+                fresh.append(row)
+                self._watermarks[kind] = max(self._watermarks[kind], obj.id)
+            while len(seen) > SEEN_IDS:
+                seen.popitem(last=False)
+            if fresh:
+                self.publish(build(fresh))
+        self._changed_since = started
+        db.session.remove()
+
+
+hub = LiveHub()
+
+
+def format_event(live_event):
+    """One SSE message."""
+    return (
+        f"id: {live_event['type']}-{live_event['id']}\n"
+        f"event: {live_event['type']}\n"
+        f"data: {json.dumps(live_event, separators=(',', ':'))}\n\n"
+    )
+
+
+@event.listens_for(Case, 'after_insert')
+@event.listens_for(Alert, 'after_insert')
+@event.listens_for(EnvironmentalData, 'after_insert')
+@event.listens_for(Alert, 'after_update')
+def _record_change(mapper, connection, target):
+    object_session(target).info['live_pending'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _nudge_hub(session):
+    if session.info.pop('live_pending', False):
+        hub.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('live_pending', None)
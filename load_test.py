@@ -0,0 +1,131 @@
+"""
+Simple HTTP load test for comparing the dev server with gunicorn.
+
+    python load_test.py http://localhost:5000/login -n 2000 -c 16
+    python load_test.py --compare -n 2000 -c 16
+
+--compare starts the Werkzeug dev server (run.py) and gunicorn (wsgi.py with
+gunicorn.conf.py) one after the other on a spare port and prints
+requests/sec and latency percentiles for each.
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_load(url, requests, concurrency):
+    """Hit url with keep-alive connections; returns (requests/sec, latencies, errors)."""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        local = []
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    raise http.client.HTTPException(response.status)
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                with lock:
+                    errors[0] += 1
+                continue
+            local.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_worker]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, sorted(latencies), errors[0]
+
+
+def report(label, rate, latencies, errors):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    print(f"{label:<12} {rate:>9.1f} req/s   p50 {percentile(0.5):7.1f} ms   "
+          f"p95 {percentile(0.95):7.1f} ms   errors {errors}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def compare(path, requests, concurrency):
+    servers = [
+        ('dev server', [sys.executable, 'run.py']),
+        ('gunicorn', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']),
+    ]
+    for label, command in servers:
+        port = free_port()
+        env = dict(os.environ, PORT=str(port), FLASK_DEBUG='False', GUNICORN_ACCESS_LOG='/dev/null')
+        process = subprocess.Popen(command, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for(port):
+                print(f"{label}: did not start")
+                continue
+            url = f"http://127.0.0.1:{port}{path}"
+            run_load(url, min(requests, 100), concurrency)  # warm up
+            report(label, *run_load(url, requests, concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', nargs='?', help='URL to load (omit with --compare)')
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('--compare', action='store_true', help='benchmark the dev server against gunicorn')
+    parser.add_argument('--path', default='/login', help='path to load in --compare mode')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.path, args.requests, args.concurrency)
+    elif args.url:
+        report('result', *run_load(args.url, args.requests, args.concurrency))
+    else:
+        parser.error('a URL or --compare is required')
+
+
+if __name__ == '__main__':
+    main()
@@ -20,11 +20,31 @@ class Disease(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
 
+class Region(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    level = db.Column(db.String(20), nullable=False)  # state, district
+    parent_id = db.Column(db.Integer, db.ForeignKey('region.id'))
+    
+    parent = db.relationship('Region', remote_side=[id], backref=db.backref('children', lazy=True))
+    
+    __table_args__ = (
+        db.UniqueConstraint('level', 'parent_id', 'name', name='uq_region_level_parent_name'),
+    )
+
 class Location(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    region_id = db.Column(db.Integer, db.ForeignKey('region.id'))  # the village's district (or state)
+    
+    region = db.relationship('Region', backref=db.backref('locations', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_location_lat_lng', 'latitude', 'longitude'),
+        db.Index('ix_location_region', 'region_id'),
+    )
 
 class Case(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +58,10 @@ class Case(db.Model):
     disease = db.relationship('Disease', backref=db.backref('cases', lazy=True))
     location = db.relationship('Location', backref=db.backref('cases', lazy=True))
     user = db.relationship('User', backref=db.backref('cases', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_case_location_date', 'location_id', 'case_date'),
+    )
 
 class EnvironmentalData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -49,6 +73,10 @@ class EnvironmentalData(db.Model):
     temperature = db.Column(db.Float)
     
     location = db.relationship('Location', backref=db.backref('env_data', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_environmental_data_location_time', 'location_id', 'timestamp'),
+    )
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -60,6 +88,10 @@ class Alert(db.Model):
     
     location = db.relationship('Location', backref=db.backref('alerts', lazy=True))
     user = db.relationship('User', backref=db.backref('alerts_created', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_alert_alert_date', 'alert_date'),
+    )
 
 class Recipient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -70,6 +102,11 @@ class Recipient(db.Model):
     created_at = db.Column(db.DateTime, server_default=func.now())
     
     location = db.relationship('Location', backref=db.backref('recipients', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_recipient_location_active', 'location_id', 'is_active'),
+        db.Index('ix_recipient_phone', 'phone_number'),
+    )
 
 class SMSHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,3 +120,167 @@ class SMSHistory(db.Model):
     
     recipient = db.relationship('Recipient', backref=db.backref('sms_history', lazy=True))
     user = db.relationship('User', backref=db.backref('sms_sent', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_sms_history_sent', 'sent_at', 'id'),
+        db.Index('ix_sms_history_status_sent', 'status', 'sent_at', 'id'),
+        db.Index('ix_sms_history_type_sent', 'alert_type', 'sent_at', 'id'),
+        db.Index('ix_sms_history_recipient_sent', 'recipient_id', 'sent_at', 'id'),
+        db.Index('ix_sms_history_message_ft', 'message', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class StatCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    recounted_at = db.Column(db.DateTime, server_default=func.now())
+
+class SymptomPosting(db.Model):
+    term = db.Column(db.String(64), primary_key=True)
+    case_id = db.Column(db.Integer, primary_key=True)
+    # Copied from the case so aggregates never touch the case table
+    location_id = db.Column(db.Integer, nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    num_cases = db.Column(db.Integer, nullable=False, default=1)
+    term_count = db.Column(db.Integer, nullable=False, default=1)
+    
+    __table_args__ = (
+        db.Index('ix_symptom_posting_term_week', 'term', 'week_start', 'location_id'),
+        db.Index('ix_symptom_posting_case', 'case_id'),
+    )
+
+class CaseClassification(db.Model):
+    case_id = db.Column(db.Integer, primary_key=True)
+    disease_id = db.Column(db.Integer, db.ForeignKey('disease.id'))  # None when no disease scored high enough
+    score = db.Column(db.Float, nullable=False, default=0)
+    model_version = db.Column(db.String(40))
+    classified_at = db.Column(db.DateTime, server_default=func.now())
+    
+    disease = db.relationship('Disease')
+
+# Cold storage for rows moved out of the live tables by `flask archive`.
+# Same columns as the live tables, without foreign keys so they stand alone.
+class ArchivedCase(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    disease_id = db.Column(db.Integer, nullable=False)
+    location_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    case_date = db.Column(db.DateTime, index=True)
+    symptoms = db.Column(db.Text)
+    num_cases = db.Column(db.Integer, default=1)
+    archived_at = db.Column(db.DateTime, server_default=func.now())
+
+class ArchivedSymptomPosting(db.Model):
+    term = db.Column(db.String(64), primary_key=True)
+    case_id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    num_cases = db.Column(db.Integer, nullable=False, default=1)
+    term_count = db.Column(db.Integer, nullable=False, default=1)
+    
+    __table_args__ = (
+        db.Index('ix_archived_symptom_posting_term_week', 'term', 'week_start', 'location_id'),
+    )
+
+class ArchivedAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    location_id = db.Column(db.Integer, nullable=False)
+    alert_date = db.Column(db.DateTime, index=True)
+    message = db.Column(db.Text, nullable=False)
+    severity = db.Column(db.String(50))
+    created_by = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, server_default=func.now())
+
+class ArchivedSMSHistory(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    alert_type = db.Column(db.String(50))
+    status = db.Column(db.String(20))
+    sent_at = db.Column(db.DateTime, index=True)
+    sent_by = db.Column(db.Integer)
+    twilio_sid = db.Column(db.String(100))
+    archived_at = db.Column(db.DateTime, server_default=func.now())
+
+class ArchiveCheckpoint(db.Model):
+    table_name = db.Column(db.String(50), primary_key=True)
+    horizon = db.Column(db.DateTime, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    moved = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, server_default=func.now())
+
+class SyncReceipt(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    case_id = db.Column(db.Integer, nullable=False)
+    received_at = db.Column(db.DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_sync_receipt_user_key'),
+    )
+
+class LocationRisk(db.Model):
+    location_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0)
+    level = db.Column(db.String(10), nullable=False, default='Low')
+    recent_cases = db.Column(db.Integer, nullable=False, default=0)
+    previous_cases = db.Column(db.Integer, nullable=False, default=0)
+    case_velocity = db.Column(db.Float, nullable=False, default=0)  # cases per day over the recent window
+    water_score = db.Column(db.Float)  # 0-1, NULL without a current reading
+    reading_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_location_risk_score', 'score'),
+    )
+
+class RegionRollup(db.Model):
+    region_id = db.Column(db.Integer, primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)
+    disease_id = db.Column(db.Integer, primary_key=True)
+    cases = db.Column(db.Integer, nullable=False, default=0)  # sum of num_cases
+    reports = db.Column(db.Integer, nullable=False, default=0)
+
+class CaseForecast(db.Model):
+    location_id = db.Column(db.Integer, primary_key=True)
+    disease_id = db.Column(db.Integer, primary_key=True)
+    forecast_date = db.Column(db.Date, primary_key=True)
+    expected = db.Column(db.Float, nullable=False)
+    lower = db.Column(db.Float, nullable=False)
+    upper = db.Column(db.Float, nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_case_forecast_date', 'forecast_date'),
+    )
+
+class ForecastState(db.Model):
+    location_id = db.Column(db.Integer, primary_key=True)
+    disease_id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # inputs the last fit saw
+    fitted_at = db.Column(db.DateTime, nullable=False)
+
+class AlertWindow(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, nullable=False)
+    severity = db.Column(db.String(50), nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False)
+    alert_id = db.Column(db.Integer, nullable=False)  # the alert repeats were merged into
+    opened_at = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    suppressed = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('location_id', 'severity', 'window_start', name='uq_alert_window'),
+        db.Index('ix_alert_window_location_opened', 'location_id', 'opened_at'),
+        db.Index('ix_alert_window_opened', 'opened_at'),
+    )
+
+class ReadingStats(db.Model):
+    location_id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)  # ph, turbidity, temperature
+    count = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0)
+    m2 = db.Column(db.Float, nullable=False, default=0)  # sum of squared deviations (Welford)
+    recent = db.Column(db.String(255), nullable=False, default='')  # last few values, comma separated
+    updated_at = db.Column(db.DateTime)
@@ -0,0 +1,212 @@
+"""
+On-demand request profiling for admins.
+
+An admin adds `?_profile=1` to a URL (or sends an `X-Profile: 1` header) and
+that request runs under cProfile, with every SQL statement it issues and
+the statement's time recorded. Each run is written to PROFILE_DIR as a
+pstats file plus a JSON summary, the oldest runs beyond PROFILE_KEEP are
+removed, and the response carries an X-Profile-Id header naming the run.
+Runs are listed at /admin/profiles.
+
+Requests without the flag only pay for the flag check: the profiler and
+the SQL listeners are attached for the profiled request and removed after
+it. One request per process is profiled at a time, since the profiler and
+the engine listeners see every thread.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+from sqlalchemy import event
+
+from .models import db
+
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+
+# Statements longer than this are cut in the summary
+STATEMENT_CHARS = 2000
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+NAME_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9]{6}-[a-z0-9_-]{1,80}$')
+
+_busy = threading.Lock()
+
+
+def profile_dir():
+    """PROFILE_DIR, or profiles/ in the instance folder; private to this user."""
+    directory = os.environ.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Runs hold SQL text and pstats files that load() unmarshals
+    if hasattr(os, 'getuid') and os.stat(directory).st_uid != os.getuid():
+        raise RuntimeError(f'Profile directory {directory} belongs to another user')
+    return directory
+
+
+def _requested():
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+class SQLRecorder:
+    """Statements and timings issued by one thread while attached."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = threading.get_ident()
+        self.statements = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread:
+            conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() != self.thread or not conn.info.get('profile_started'):
+            return
+        elapsed = time.perf_counter() - conn.info['profile_started'].pop()
+        self.statements.append({
+            'sql': ' '.join(statement.split())[:STATEMENT_CHARS],
+            'ms': round(elapsed * 1000, 3),
+            'many': executemany
+        })
+
+    def attach(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+
+    def detach(self):
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+
+def _start():
+    if not _requested() or not current_user.is_authenticated or current_user.role != 'admin':
+        return
+    if not _busy.acquire(blocking=False):
+        g.profile_busy = True
+        return
+    recorder = SQLRecorder(db.engine)
+    recorder.attach()
+    profiler = cProfile.Profile()
+    g.profile = (profiler, recorder, time.perf_counter())
+    profiler.enable()
+
+
+def _finish(response):
+    if 'profile' not in g:
+        if g.get('profile_busy'):
+            response.headers['X-Profile-Id'] = 'busy'
+        return response
+    profiler, recorder, started = g.pop('profile')
+    try:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        recorder.detach()
+        name = save(profiler, recorder.statements, elapsed, response.status_code)
+        response.headers['X-Profile-Id'] = name
+    finally:
+        _busy.release()
+    return response
+
+
+def _abandon(error=None):
+    # Release the profiler if after_request did not get to it
+    if 'profile' in g:
+        profiler, recorder, _ = g.pop('profile')
+        profiler.disable()
+        recorder.detach()
+        _busy.release()
+
+
+def save(profiler, statements, elapsed, status):
+    """Write one run and prune old ones; returns its name."""
+    now = datetime.now()
+    slug = re.sub(r'[^a-z0-9]+', '-', request.path.lower()).strip('-')[:60] or 'root'
+    name = f"{now:%Y%m%d-%H%M%S-%f}-{request.method.lower()}-{slug}"
+    directory = profile_dir()
+
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    summary = {
+        'name': name,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': status,
+        'user': current_user.username,
+        'started_at': now.isoformat(timespec='seconds'),
+        'ms': round(elapsed * 1000, 1),
+        'sql_count': len(statements),
+        'sql_ms': round(sum(statement['ms'] for statement in statements), 1),
+        'statements': statements
+    }
+    with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as handle:
+        json.dump(summary, handle)
+
+    _prune(directory)
+    return name
+
+
+def _prune(directory):
+    names = sorted(entry[:-5] for entry in os.listdir(directory) if entry.endswith('.json'))
+    for old in names[:-PROFILE_KEEP] if PROFILE_KEEP else names:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, old + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def runs():
+    """Summaries of stored runs, newest first, without their statements."""
+    directory = profile_dir()
+    summaries = []
+    for entry in sorted(os.listdir(directory), reverse=True):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, entry), encoding='utf-8') as handle:
+                summary = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        summary.pop('statements', None)
+        summaries.append(summary)
+    return summaries
+
+
+def load(name, sort='cumulative', limit=40):
+    """(summary, pstats text) of one run, or None if it does not exist."""
+    if not NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(profile_dir(), name)
+    try:
+        with open(path + '.json', encoding='utf-8') as handle:
+            summary = json.load(handle)
+    except FileNotFoundError:
+        return None
+
+    output = io.StringIO()
+    try:
+        stats = pstats.Stats(path + '.prof', stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    except OSError as e:
+        output.write(f'Profile unavailable: {e}\n')
+    return summary, output.getvalue()
+
+
+def prof_path(name):
+    if not NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(profile_dir(), name + '.prof')
+    return path if os.path.exists(path) else None
+
+
+def init_app(app):
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_abandon)
@@ -0,0 +1,146 @@
+"""
+Bulk import of SMS recipients from CSV.
+
+The CSV is streamed row by row (columns: name, phone_number, location or
+location_id). Numbers are normalized to E.164 and rows are upserted in
+chunks keyed by (phone number, location). Recipients of the imported
+locations that are missing from the file are deactivated rather than
+deleted, so their SMS history stays linked.
+"""
+import csv
+
+from sqlalchemy import func
+
+from .models import db, Location, Recipient
+from .broadcast import normalize_phone
+from .counters import bump
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Invalid rows reported back in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+
+def location_summary():
+    """Active recipients per location, from a single GROUP BY."""
+    return db.session.query(
+        Location.name,
+        func.count(Recipient.id)
+    ).join(
+        Recipient, Recipient.location_id == Location.id
+    ).filter(
+        Recipient.is_active == True
+    ).group_by(Location.id, Location.name).order_by(Location.name).all()
+
+
+def _flush(inserts, updates):
+    """Write one chunk of upserts and keep the active-recipient counter in step."""
+    reactivated = sum(1 for update in updates if update.pop('_reactivated'))
+    if inserts:
+        db.session.bulk_insert_mappings(Recipient, inserts)
+    if updates:
+        db.session.bulk_update_mappings(Recipient, updates)
+    # Bulk writes bypass the counter listeners
+    bump('recipients_active', len(inserts) + reactivated)
+    db.session.commit()
+
+
+def import_recipients(stream, chunk_size=DEFAULT_CHUNK_SIZE, deactivate_missing=True):
+    """Upsert recipients from a CSV text stream; returns a result summary dict."""
+    result = {
+        'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0,
+        'deactivated': 0, 'invalid': 0, 'errors': []
+    }
+
+    # One lookup each for locations and existing recipients
+    locations_by_name = {}
+    location_ids = set()
+    for location_id, name in db.session.query(Location.id, Location.name):
+        locations_by_name.setdefault((name or '').strip().lower(), []).append(location_id)
+        location_ids.add(location_id)
+    existing = {}
+    for recipient_id, name, phone_number, location_id, is_active in db.session.query(
+        Recipient.id, Recipient.name, Recipient.phone_number, Recipient.location_id, Recipient.is_active
+    ):
+        number = normalize_phone(phone_number) or phone_number
+        existing[(number, location_id)] = (recipient_id, name, phone_number, is_active)
+
+    seen = set()
+    imported_locations = set()
+    inserts, updates = [], []
+
+    def error(line, message):
+        result['invalid'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'line': line, 'message': message})
+
+    reader = csv.DictReader(stream)
+    for line, row in enumerate(reader, 2):
+        result['rows'] += 1
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+        number = normalize_phone(row.get('phone_number') or row.get('phone'))
+        if number is None:
+            error(line, 'Invalid phone number')
+            continue
+
+        if row.get('location_id', '').isdigit():
+            location_id = int(row['location_id'])
+            if location_id not in location_ids:
+                location_id = None
+        else:
+            # Names are not unique (every report adds a "Case Location")
+            matches = locations_by_name.get(row.get('location', '').lower(), [])
+            if len(matches) > 1:
+                error(line, f"Location name matches {len(matches)} locations; give its location_id")
+                continue
+            location_id = matches[0] if matches else None
+        if location_id is None:
+            error(line, 'Unknown location')
+            continue
+
+        key = (number, location_id)
+        if key in seen:
+            result['duplicates'] += 1
+            continue
+        seen.add(key)
+        imported_locations.add(location_id)
+        name = row.get('name') or f"Recipient {number}"
+
+        if key in existing:
+            recipient_id, old_name, old_number, is_active = existing[key]
+            if old_name == name and old_number == number and is_active:
+                result['unchanged'] += 1
+                continue
+            updates.append({
+                'id': recipient_id,
+                'name': name,
+                'phone_number': number,
+                'is_active': True,
+                '_reactivated': not is_active
+            })
+            result['updated'] += 1
+        else:
+            inserts.append({'name': name, 'phone_number': number, 'location_id': location_id, 'is_active': True})
+            result['inserted'] += 1
+
+        if len(inserts) + len(updates) >= chunk_size:
+            _flush(inserts, updates)
+            inserts, updates = [], []
+
+    _flush(inserts, updates)
+
+    if deactivate_missing:
+        missing = [
+            recipient_id
+            for key, (recipient_id, _, _, is_active) in existing.items()
+            if is_active and key[1] in imported_locations and key not in seen
+        ]
+        for start in range(0, len(missing), chunk_size):
+            ids = missing[start:start + chunk_size]
+            Recipient.query.filter(Recipient.id.in_(ids)).update({'is_active': False}, synchronize_session=False)
+            bump('recipients_active', -len(ids))
+            db.session.commit()
+        result['deactivated'] = len(missing)
+
+    return result
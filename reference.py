@@ -0,0 +1,140 @@
+"""
+Per-process cache of the disease and location lookup tables.
+
+Pages that only need ids, names and coordinates for dropdowns, chart labels
+and validation read immutable snapshots (tuples of slotted namedtuples plus
+id indexes) instead of querying the tables on every request. Each table has
+a version counter in stat_counter, bumped by the code that adds or edits
+diseases and locations (`add_disease`, `add_location`, region assignment,
+default data and scripts) in the same transaction; a worker reloads its
+snapshot only when the stored version differs from the one it holds.
+
+Case reports create a "Case Location" row for every new pair of
+coordinates. Those do not bump the version, or every report would make
+every worker reload an ever-growing table; looking up an id the snapshot
+does not hold reads that one row instead.
+"""
+import threading
+from collections import namedtuple
+
+from flask import g, has_request_context
+
+from .models import db, Disease, Location, StatCounter
+
+DiseaseRef = namedtuple('DiseaseRef', 'id name description')
+LocationRef = namedtuple('LocationRef', 'id name latitude longitude region_id')
+
+# kind -> (model, snapshot row type, version counter name)
+TABLES = {
+    'diseases': (Disease, DiseaseRef, 'reference_diseases'),
+    'locations': (Location, LocationRef, 'reference_locations'),
+}
+
+
+class Snapshot:
+    """Rows of one lookup table as loaded at a version."""
+
+    __slots__ = ('version', 'rows', 'by_id')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.by_id = {row.id: row for row in rows}
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def _versions():
+    """{kind: version}, read once per request."""
+    if has_request_context() and 'reference_versions' in g:
+        return g.reference_versions
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value).filter(
+        StatCounter.name.in_([counter for _, _, counter in TABLES.values()])
+    ).all())
+    versions = {kind: counters.get(counter, 0) for kind, (_, _, counter) in TABLES.items()}
+    if has_request_context():
+        g.reference_versions = versions
+    return versions
+
+
+def snapshot(kind):
+    """Current Snapshot of 'diseases' or 'locations', reloaded if its version moved."""
+    version = _versions()[kind]
+    current = _snapshots.get(kind)
+    if current is not None and current.version == version:
+        return current
+
+    model, row_type, _ = TABLES[kind]
+    columns = [getattr(model, field) for field in row_type._fields]
+    rows = tuple(
+        row_type(*row) for row in db.session.query(*columns).order_by(model.id)
+    )
+    current = Snapshot(version, rows)
+    with _lock:
+        _snapshots[kind] = current
+    return current
+
+
+def diseases():
+    return snapshot('diseases').rows
+
+
+def locations():
+    return snapshot('locations').rows
+
+
+def _lookup(kind, row_id):
+    row = snapshot(kind).by_id.get(row_id)
+    if row is None and row_id is not None:
+        # Added since the last bump (e.g. a report's Case Location)
+        model, row_type, _ = TABLES[kind]
+        found = db.session.query(*[getattr(model, field) for field in row_type._fields]).filter(
+            model.id == row_id
+        ).first()
+        row = row_type(*found) if found else None
+    return row
+
+
+def disease(disease_id):
+    return _lookup('diseases', disease_id)
+
+
+def location(location_id):
+    return _lookup('locations', location_id)
+
+
+def disease_named(name):
+    return next((row for row in diseases() if row.name == name), None)
+
+
+def _bump(connection, counter):
+    table = StatCounter.__table__
+    updated = connection.execute(
+        table.update().where(table.c.name == counter).values(value=table.c.value + 1)
+    )
+    if not updated.rowcount:
+        connection.execute(table.insert(), {'name': counter, 'value': 1})
+
+
+def _forget(kinds):
+    with _lock:
+        for kind in kinds:
+            _snapshots.pop(kind, None)
+    if has_request_context():
+        g.pop('reference_versions', None)
+
+
+def bump(*kinds):
+    """Invalidate the snapshots of kinds after adding or editing their rows (the caller commits)."""
+    connection = db.session.connection()
+    for kind in kinds:
+        _bump(connection, TABLES[kind][2])
+    # This worker reloads on its next read even before the commit lands
+    _forget(kinds)
+
+
+def bump_all():
+    """Invalidate every snapshot after bulk changes (the caller commits)."""
+    bump(*TABLES)
@@ -0,0 +1,360 @@
+"""
+Administrative region hierarchy (state -> district -> village) and rollups.
+
+Each location points at its district (or state), and region_rollup holds
+case totals per region, ISO week and disease for every level of the
+hierarchy. A flush that inserts, changes or deletes cases adjusts the
+rollup rows of the affected regions in the same transaction, so regional
+summaries and drill-downs read a handful of precomputed rows instead of
+grouping every case. Bulk deletes bypass the listener; `flask
+rebuild-region-rollups` recomputes everything from live and archived cases.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, event, func, inspect, select, union_all
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from .models import (db, ArchivedCase, Case, EnvironmentalData, Location, Region,
+                     RegionRollup)
+from . import reference
+from .geo import haversine_km
+from .symptom_index import week_start
+
+# region_id -> parent_id, reloaded when a region is unknown or added. Never
+# mutated: a reload builds a new dict and swaps the reference, so threads
+# reading the old one see it whole
+_parents = {}
+
+
+def _load_parents(connection):
+    global _parents
+    table = Region.__table__
+    _parents = parents = dict(connection.execute(select(table.c.id, table.c.parent_id)).all())
+    return parents
+
+
+def ancestors(connection, region_id):
+    """The region and every region above it."""
+    parents = _parents
+    if region_id not in parents:
+        parents = _load_parents(connection)
+    chain = []
+    while region_id is not None and region_id in parents and region_id not in chain:
+        chain.append(region_id)
+        region_id = parents[region_id]
+    return chain
+
+
+@event.listens_for(Region, 'after_insert')
+@event.listens_for(Region, 'after_update')
+def _forget_parents(mapper, connection, target):
+    global _parents
+    _parents = {}
+
+
+def get_or_create(name, level, parent=None):
+    """Region with this name under parent, added to the session if new."""
+    region = Region.query.filter_by(
+        name=name, level=level, parent_id=parent.id if parent else None
+    ).first()
+    if region is None:
+        region = Region(name=name, level=level, parent=parent)
+        db.session.add(region)
+        db.session.flush()
+    return region
+
+
+CASE_FIELDS = ('location_id', 'case_date', 'disease_id', 'num_cases')
+
+
+def _record_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the previous value when a field is set while expired (e.g. after a commit),
+# so the old rollup bucket is known
+for _name in CASE_FIELDS:
+    event.listen(getattr(Case, _name), 'set', _record_old_value, active_history=True, retval=True)
+
+
+def _case_values(obj, old=False, loaded_only=False):
+    """(location_id, week, disease_id, num_cases) of a case before or after this flush.
+
+    loaded_only reads only what the object holds: inserted rows have not
+    fetched server defaults (case_date) yet, and deleted rows are gone but
+    were loaded before the flush.
+    """
+    state = inspect(obj)
+    values = []
+    for name in CASE_FIELDS:
+        attribute = state.attrs[name]
+        if old and attribute.history.deleted:
+            values.append(attribute.history.deleted[0])
+        elif loaded_only:
+            values.append(state.dict.get(name))
+        else:
+            # Loads the attribute if it was expired
+            values.append(getattr(obj, name))
+    location_id, case_date, disease_id, num_cases = values
+    return location_id, week_start(case_date or datetime.now()), disease_id, int(num_cases or 1)
+
+
+def _flush_deltas(session):
+    """Per (location, week, disease) changes of [cases, reports] in this flush."""
+    deltas = {}
+
+    def add(values, sign):
+        location_id, week, disease_id, num_cases = values
+        delta = deltas.setdefault((location_id, week, disease_id), [0, 0])
+        delta[0] += sign * num_cases
+        delta[1] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Case):
+            add(_case_values(obj, loaded_only=True), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            add(_case_values(obj, old=True, loaded_only=True), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Case) and session.is_modified(obj):
+            add(_case_values(obj, old=True), -1)
+            add(_case_values(obj), 1)
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def _apply(connection, rollups):
+    """Add {(region_id, week, disease_id): [cases, reports]} onto the rollup table."""
+    table = RegionRollup.__table__
+    rows = [
+        {'region_id': region_id, 'week_start': week, 'disease_id': disease_id, 'cases': cases, 'reports': reports}
+        for (region_id, week, disease_id), (cases, reports) in rollups.items()
+        if cases or reports
+    ]
+    if not rows:
+        return
+    if connection.dialect.name == 'mysql':
+        statement = mysql_insert(table).values(rows)
+        connection.execute(statement.on_duplicate_key_update(
+            cases=table.c.cases + statement.inserted.cases,
+            reports=table.c.reports + statement.inserted.reports
+        ))
+        return
+    for row in rows:
+        updated = connection.execute(table.update().where(
+            table.c.region_id == row['region_id'],
+            table.c.week_start == row['week_start'],
+            table.c.disease_id == row['disease_id']
+        ).values(
+            cases=table.c.cases + row['cases'],
+            reports=table.c.reports + row['reports']
+        ))
+        if not updated.rowcount:
+            connection.execute(table.insert(), row)
+
+
+def _to_regions(connection, location_deltas):
+    """Spread per-location deltas onto each location's region and its ancestors."""
+    location_table = Location.__table__
+    region_ids = dict(connection.execute(
+        select(location_table.c.id, location_table.c.region_id).where(
+            location_table.c.id.in_({location_id for location_id, _, _ in location_deltas}),
+            location_table.c.region_id.isnot(None)
+        )
+    ).all())
+
+    rollups = {}
+    for (location_id, week, disease_id), (cases, reports) in location_deltas.items():
+        if location_id not in region_ids:
+            continue
+        for region_id in ancestors(connection, region_ids[location_id]):
+            rollup = rollups.setdefault((region_id, week, disease_id), [0, 0])
+            rollup[0] += cases
+            rollup[1] += reports
+    return rollups
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted_cases(session, flush_context, instances):
+    # Rows are gone by after_flush, so load what the rollups need while they exist
+    for obj in session.deleted:
+        if isinstance(obj, Case):
+            for name in CASE_FIELDS:
+                getattr(obj, name)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_rollups(session, flush_context):
+    deltas = _flush_deltas(session)
+    if deltas:
+        connection = session.connection()
+        _apply(connection, _to_regions(connection, deltas))
+
+
+def rebuild(batch_size=5000):
+    """Recompute every rollup row from live and archived cases; returns rows written."""
+    connection = db.session.connection()
+    connection.execute(RegionRollup.__table__.delete())
+
+    sources = [
+        select(model.location_id, model.case_date, model.disease_id, model.num_cases)
+        for model in (Case, ArchivedCase)
+    ]
+    cases = union_all(*sources).subquery()
+    rows = db.session.execute(
+        select(
+            cases.c.location_id,
+            func.date(cases.c.case_date),
+            cases.c.disease_id,
+            func.sum(cases.c.num_cases),
+            func.count()
+        ).group_by(cases.c.location_id, func.date(cases.c.case_date), cases.c.disease_id)
+    ).all()
+
+    # Day totals are folded into weeks here so the query stays portable
+    location_deltas = {}
+    for location_id, day, disease_id, cases_sum, reports in rows:
+        if day is None:
+            continue
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        delta = location_deltas.setdefault((location_id, week_start(day), disease_id), [0, 0])
+        delta[0] += int(cases_sum or 0)
+        delta[1] += reports
+
+    rollups = _to_regions(connection, location_deltas) if location_deltas else {}
+    items = list(rollups.items())
+    for start in range(0, len(items), batch_size):
+        _apply(connection, dict(items[start:start + batch_size]))
+    db.session.commit()
+    return len(items)
+
+
+def assign_nearest(max_km=25):
+    """Give locations without a region the region of the nearest assigned location."""
+    assigned = db.session.query(Location.latitude, Location.longitude, Location.region_id).filter(
+        Location.region_id.isnot(None)
+    ).all()
+    unassigned = Location.query.filter(Location.region_id.is_(None)).all()
+    if not assigned or not unassigned:
+        return 0
+
+    lats = np.array([row[0] for row in assigned])
+    lngs = np.array([row[1] for row in assigned])
+    count = 0
+    for location in unassigned:
+        distances = haversine_km(location.latitude, location.longitude, lats, lngs)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] <= max_km:
+            location.region_id = assigned[nearest][2]
+            count += 1
+    if count:
+        reference.bump('locations')
+    db.session.commit()
+    return count
+
+
+def _week_range(weeks):
+    return week_start(date.today()) - timedelta(weeks=weeks - 1)
+
+
+def summaries(parent_id=None, weeks=12, disease_id=None):
+    """Totals over the last weeks for the child regions of parent (states when None)."""
+    conditions = [RegionRollup.region_id == Region.id, RegionRollup.week_start >= _week_range(weeks)]
+    if disease_id:
+        conditions.append(RegionRollup.disease_id == disease_id)
+    query = db.session.query(
+        Region.id,
+        Region.name,
+        Region.level,
+        func.coalesce(func.sum(RegionRollup.cases), 0),
+        func.coalesce(func.sum(RegionRollup.reports), 0)
+    ).outerjoin(RegionRollup, and_(*conditions))
+    if parent_id is None:
+        query = query.filter(Region.parent_id.is_(None))
+    else:
+        query = query.filter(Region.parent_id == parent_id)
+    rows = query.group_by(Region.id, Region.name, Region.level).all()
+    return sorted(
+        ({'id': region_id, 'name': name, 'level': level, 'cases': int(cases), 'reports': int(reports)}
+         for region_id, name, level, cases, reports in rows),
+        key=lambda summary: (-summary['cases'], summary['name'])
+    )
+
+
+def village_summaries(region_id, weeks=12, disease_id=None):
+    """Per-village totals inside one district, from its live and archived cases like the rollups."""
+    villages = select(Location.id).where(Location.region_id == region_id)
+    sources = []
+    for model in (Case, ArchivedCase):
+        source = select(model.id, model.location_id, model.num_cases).where(
+            model.location_id.in_(villages),
+            model.case_date >= _week_range(weeks)
+        )
+        if disease_id:
+            source = source.where(model.disease_id == disease_id)
+        sources.append(source)
+    cases = union_all(*sources).subquery()
+    query = db.session.query(
+        Location.id,
+        Location.name,
+        func.coalesce(func.sum(cases.c.num_cases), 0),
+        func.count(cases.c.id)
+    ).outerjoin(cases, cases.c.location_id == Location.id).filter(Location.region_id == region_id)
+    rows = query.group_by(Location.id, Location.name).all()
+    return sorted(
+        ({'id': location_id, 'name': name, 'level': 'village', 'cases': int(cases), 'reports': int(reports)}
+         for location_id, name, cases, reports in rows),
+        key=lambda summary: (-summary['cases'], summary['name'] or '')
+    )
+
+
+def weekly(region_id, weeks=12, disease_id=None):
+    """[(week_start, cases)] for one region, oldest first."""
+    query = db.session.query(
+        RegionRollup.week_start,
+        func.sum(RegionRollup.cases)
+    ).filter(
+        RegionRollup.region_id == region_id,
+        RegionRollup.week_start >= _week_range(weeks)
+    )
+    if disease_id:
+        query = query.filter(RegionRollup.disease_id == disease_id)
+    return [(week, int(cases)) for week, cases in query.group_by(RegionRollup.week_start).order_by(RegionRollup.week_start)]
+
+
+def trends_panel(days=30, limit=5):
+    """{state: {'cases', 'rainfall'}} for the trends page regions panel."""
+    states = summaries(weeks=max(1, days // 7))[:limit]
+    if not states:
+        return {}
+
+    # Mean rainfall per district (or state) over the same period, folded into states
+    connection = db.session.connection()
+    rainfall = {}
+    for region_id, total, readings in db.session.query(
+        Location.region_id,
+        func.sum(EnvironmentalData.rainfall),
+        func.count(EnvironmentalData.rainfall)
+    ).join(
+        Location, EnvironmentalData.location_id == Location.id
+    ).filter(
+        Location.region_id.isnot(None),
+        EnvironmentalData.timestamp >= datetime.now() - timedelta(days=days)
+    ).group_by(Location.region_id):
+        chain = ancestors(connection, region_id)
+        if not chain:
+            continue
+        state_id = chain[-1]
+        state_total, state_readings = rainfall.get(state_id, (0.0, 0))
+        rainfall[state_id] = (state_total + float(total or 0), state_readings + readings)
+
+    panel = {}
+    for state in states:
+        total, readings = rainfall.get(state['id'], (0.0, 0))
+        panel[state['name']] = {
+            'cases': state['cases'],
+            'rainfall': round(total / readings, 1) if readings else None
+        }
+    return panel
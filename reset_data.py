@@ -2,7 +2,10 @@
 Script to reset database with North East India village data
 """
 from app import create_app, db
-from app.models import Case, Disease, Location, User, Alert, EnvironmentalData
+from app.models import (Case, Disease, Location, User, Alert, EnvironmentalData, SymptomPosting, LocationRisk, Region, RegionRollup, ReadingStats,
+                        AlertWindow, CaseClassification, CaseForecast, ForecastState, SyncReceipt)
+from app.regions import get_or_create as get_or_create_region
+from app import reference
 from datetime import datetime, timedelta
 import random
 
@@ -13,10 +16,23 @@ def reset_database():
         
         # Delete all existing data (except users)
         Case.query.delete()
+        SymptomPosting.query.delete()
+        CaseClassification.query.delete()
+        CaseForecast.query.delete()
+        ForecastState.query.delete()
+        SyncReceipt.query.delete()
         Alert.query.delete()
+        AlertWindow.query.delete()
         EnvironmentalData.query.delete()
+        ReadingStats.query.delete()
+        LocationRisk.query.delete()
         Location.query.delete()
+        RegionRollup.query.delete()
+        Region.query.filter_by(level='district').delete()
+        Region.query.delete()
         Disease.query.delete()
+        # Bulk deletes skip the listener that invalidates cached lookups
+        reference.bump_all()
         
         db.session.commit()
         print("✅ Existing data cleared!")
@@ -30,6 +46,7 @@ def reset_database():
             {'name': 'Diarrhea', 'description': 'Loose, watery bowel movements from contaminated water'},
             {'name': 'Dysentery', 'description': 'Intestinal infection causing bloody diarrhea'},
             {'name': 'Giardiasis', 'description': 'Intestinal parasitic infection from water'},
+            {'name': 'Unconfirmed', 'description': 'Reported illness awaiting diagnosis'},
         ]
         
         diseases = []
@@ -45,53 +62,56 @@ def reset_database():
         # North East India villages with real coordinates
         locations_data = [
             # Assam
-            {'name': 'Majuli Island', 'state': 'Assam', 'lat': 26.9501, 'lng': 94.2155},
-            {'name': 'Kaziranga Village', 'state': 'Assam', 'lat': 26.5775, 'lng': 93.1711},
-            {'name': 'Sivasagar Town', 'state': 'Assam', 'lat': 26.9845, 'lng': 94.6382},
-            {'name': 'Tezpur Village', 'state': 'Assam', 'lat': 26.6338, 'lng': 92.8000},
-            {'name': 'Jorhat Rural', 'state': 'Assam', 'lat': 26.7509, 'lng': 94.2037},
+            {'name': 'Majuli Island', 'state': 'Assam', 'district': 'Majuli', 'lat': 26.9501, 'lng': 94.2155},
+            {'name': 'Kaziranga Village', 'state': 'Assam', 'district': 'Golaghat', 'lat': 26.5775, 'lng': 93.1711},
+            {'name': 'Sivasagar Town', 'state': 'Assam', 'district': 'Sivasagar', 'lat': 26.9845, 'lng': 94.6382},
+            {'name': 'Tezpur Village', 'state': 'Assam', 'district': 'Sonitpur', 'lat': 26.6338, 'lng': 92.8000},
+            {'name': 'Jorhat Rural', 'state': 'Assam', 'district': 'Jorhat', 'lat': 26.7509, 'lng': 94.2037},
             
             # Meghalaya
-            {'name': 'Cherrapunji Village', 'state': 'Meghalaya', 'lat': 25.2691, 'lng': 91.7319},
-            {'name': 'Mawlynnong Village', 'state': 'Meghalaya', 'lat': 25.1881, 'lng': 91.9421},
-            {'name': 'Shillong Outskirts', 'state': 'Meghalaya', 'lat': 25.5788, 'lng': 91.8933},
-            {'name': 'Nongstoin Village', 'state': 'Meghalaya', 'lat': 25.5167, 'lng': 91.2667},
+            {'name': 'Cherrapunji Village', 'state': 'Meghalaya', 'district': 'East Khasi Hills', 'lat': 25.2691, 'lng': 91.7319},
+            {'name': 'Mawlynnong Village', 'state': 'Meghalaya', 'district': 'East Khasi Hills', 'lat': 25.1881, 'lng': 91.9421},
+            {'name': 'Shillong Outskirts', 'state': 'Meghalaya', 'district': 'East Khasi Hills', 'lat': 25.5788, 'lng': 91.8933},
+            {'name': 'Nongstoin Village', 'state': 'Meghalaya', 'district': 'West Khasi Hills', 'lat': 25.5167, 'lng': 91.2667},
             
             # Arunachal Pradesh
-            {'name': 'Ziro Valley', 'state': 'Arunachal Pradesh', 'lat': 27.5442, 'lng': 93.8315},
-            {'name': 'Tawang Village', 'state': 'Arunachal Pradesh', 'lat': 27.5860, 'lng': 91.8590},
-            {'name': 'Pasighat Town', 'state': 'Arunachal Pradesh', 'lat': 28.0660, 'lng': 95.3265},
+            {'name': 'Ziro Valley', 'state': 'Arunachal Pradesh', 'district': 'Lower Subansiri', 'lat': 27.5442, 'lng': 93.8315},
+            {'name': 'Tawang Village', 'state': 'Arunachal Pradesh', 'district': 'Tawang', 'lat': 27.5860, 'lng': 91.8590},
+            {'name': 'Pasighat Town', 'state': 'Arunachal Pradesh', 'district': 'East Siang', 'lat': 28.0660, 'lng': 95.3265},
             
             # Manipur
-            {'name': 'Imphal Rural', 'state': 'Manipur', 'lat': 24.8170, 'lng': 93.9368},
-            {'name': 'Moirang Village', 'state': 'Manipur', 'lat': 24.4969, 'lng': 93.7718},
-            {'name': 'Ukhrul Village', 'state': 'Manipur', 'lat': 25.0535, 'lng': 94.3574},
+            {'name': 'Imphal Rural', 'state': 'Manipur', 'district': 'Imphal West', 'lat': 24.8170, 'lng': 93.9368},
+            {'name': 'Moirang Village', 'state': 'Manipur', 'district': 'Bishnupur', 'lat': 24.4969, 'lng': 93.7718},
+            {'name': 'Ukhrul Village', 'state': 'Manipur', 'district': 'Ukhrul', 'lat': 25.0535, 'lng': 94.3574},
             
             # Nagaland
-            {'name': 'Kohima Village', 'state': 'Nagaland', 'lat': 25.6747, 'lng': 94.1079},
-            {'name': 'Dimapur Rural', 'state': 'Nagaland', 'lat': 25.9039, 'lng': 93.7291},
-            {'name': 'Mokokchung Village', 'state': 'Nagaland', 'lat': 26.3224, 'lng': 94.5244},
+            {'name': 'Kohima Village', 'state': 'Nagaland', 'district': 'Kohima', 'lat': 25.6747, 'lng': 94.1079},
+            {'name': 'Dimapur Rural', 'state': 'Nagaland', 'district': 'Dimapur', 'lat': 25.9039, 'lng': 93.7291},
+            {'name': 'Mokokchung Village', 'state': 'Nagaland', 'district': 'Mokokchung', 'lat': 26.3224, 'lng': 94.5244},
             
             # Tripura
-            {'name': 'Agartala Outskirts', 'state': 'Tripura', 'lat': 23.8315, 'lng': 91.2868},
-            {'name': 'Udaipur Village', 'state': 'Tripura', 'lat': 23.5333, 'lng': 91.4833},
+            {'name': 'Agartala Outskirts', 'state': 'Tripura', 'district': 'West Tripura', 'lat': 23.8315, 'lng': 91.2868},
+            {'name': 'Udaipur Village', 'state': 'Tripura', 'district': 'Gomati', 'lat': 23.5333, 'lng': 91.4833},
             
             # Mizoram
-            {'name': 'Aizawl Rural', 'state': 'Mizoram', 'lat': 23.7271, 'lng': 92.7176},
-            {'name': 'Champhai Village', 'state': 'Mizoram', 'lat': 23.4714, 'lng': 93.3268},
+            {'name': 'Aizawl Rural', 'state': 'Mizoram', 'district': 'Aizawl', 'lat': 23.7271, 'lng': 92.7176},
+            {'name': 'Champhai Village', 'state': 'Mizoram', 'district': 'Champhai', 'lat': 23.4714, 'lng': 93.3268},
             
             # Sikkim
-            {'name': 'Gangtok Outskirts', 'state': 'Sikkim', 'lat': 27.3389, 'lng': 88.6065},
-            {'name': 'Namchi Village', 'state': 'Sikkim', 'lat': 27.1649, 'lng': 88.3641},
-            {'name': 'Pelling Village', 'state': 'Sikkim', 'lat': 27.3161, 'lng': 88.2186},
+            {'name': 'Gangtok Outskirts', 'state': 'Sikkim', 'district': 'Gangtok', 'lat': 27.3389, 'lng': 88.6065},
+            {'name': 'Namchi Village', 'state': 'Sikkim', 'district': 'Namchi', 'lat': 27.1649, 'lng': 88.3641},
+            {'name': 'Pelling Village', 'state': 'Sikkim', 'district': 'Gyalshing', 'lat': 27.3161, 'lng': 88.2186},
         ]
         
         locations = []
         for l in locations_data:
+            state = get_or_create_region(l['state'], 'state')
+            district = get_or_create_region(l['district'], 'district', state)
             location = Location(
                 name=l['name'],
                 latitude=l['lat'],
-                longitude=l['lng']
+                longitude=l['lng'],
+                region_id=district.id
             )
             db.session.add(location)
             locations.append(location)
@@ -120,7 +140,9 @@ def reset_database():
         for location in locations:
             # Each location gets 1-3 different disease cases
             num_diseases = random.randint(1, 3)
-            selected_diseases = random.sample(diseases, num_diseases)
+            selected_diseases = random.sample(
+                [d for d in diseases if d.name != 'Unconfirmed'], num_diseases
+            )
             
             for disease in selected_diseases:
                 # Number of cases varies by severity
@@ -173,6 +195,7 @@ def reset_database():
         print(f"\n📊 Summary:")
         print(f"   • {len(diseases)} diseases")
         print(f"   • {len(locations)} village locations (North East India)")
+        print(f"   • {Region.query.filter_by(level='state').count()} states, {Region.query.filter_by(level='district').count()} districts")
         print(f"   • {cases_created} disease cases")
         print(f"   • {env_data_created} environmental data entries")
         print(f"\n🔐 Admin credentials remain unchanged:")
@@ -0,0 +1,209 @@
+"""
+Materialized per-location risk scores.
+
+Each location's score combines its recent case velocity with its latest
+water reading. Scores live in the location_risk table and are recomputed
+in the same transaction whenever a flush adds a location or touches its
+cases or environmental data, so the dashboard and map only read
+precomputed values. Scores age as the case window moves without new
+reports; `flask recompute-risk` refreshes them all and is meant to run
+hourly from cron.
+"""
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .models import db, Case, EnvironmentalData, Location, LocationRisk
+
+# Cases in the last window are compared with the window before it
+CASE_WINDOW = timedelta(days=7)
+
+# Recent case count at which the case component saturates
+CASE_SATURATION = 50
+
+# Water readings older than this no longer count
+READING_MAX_AGE = timedelta(days=30)
+
+CASE_WEIGHT = 0.6
+WATER_WEIGHT = 0.4
+
+# (minimum score, level), highest first; levels match Alert.severity
+LEVELS = ((60, 'High'), (30, 'Medium'), (0, 'Low'))
+
+
+def _clip(value):
+    return max(0.0, min(1.0, value))
+
+
+def case_score(recent, previous):
+    """0-1 from the recent case count, boosted when it is growing."""
+    score = math.log1p(recent) / math.log1p(CASE_SATURATION)
+    growth = _clip((recent - previous) / max(previous, 1))
+    return _clip(score * (1 + 0.5 * growth))
+
+
+def water_score(ph, turbidity, rainfall, temperature):
+    """0-1 from a water reading; None when it has no usable parameters."""
+    parts = []
+    if ph is not None:
+        # Safe drinking water range is 6.5-8.5
+        parts.append((0.35, _clip(max(6.5 - ph, ph - 8.5, 0) / 1.5)))
+    if turbidity is not None:
+        parts.append((0.35, _clip((turbidity - 1) / 9)))
+    if rainfall is not None:
+        # Heavy rain washes contamination into sources
+        parts.append((0.15, _clip((rainfall - 20) / 80)))
+    if temperature is not None:
+        parts.append((0.15, _clip((temperature - 25) / 10)))
+    if not parts:
+        return None
+    return sum(weight * value for weight, value in parts) / sum(weight for weight, _ in parts)
+
+
+def risk_level(score):
+    for minimum, level in LEVELS:
+        if score >= minimum:
+            return level
+
+
+def water_quality(score):
+    """Dashboard label for a water score."""
+    if score is None:
+        return 'Unknown'
+    if score < 0.2:
+        return 'Good'
+    if score < 0.5:
+        return 'Fair'
+    return 'Poor'
+
+
+def compute(connection, location_ids=None, now=None):
+    """Risk rows for the given locations (all when None), from two grouped queries."""
+    now = now or datetime.now()
+    recent_start = now - CASE_WINDOW
+    previous_start = recent_start - CASE_WINDOW
+    cases = Case.__table__
+    readings = EnvironmentalData.__table__
+
+    case_filters = [cases.c.case_date >= previous_start]
+    reading_filters = [readings.c.timestamp >= now - READING_MAX_AGE]
+    if location_ids is None:
+        location_ids = [row[0] for row in connection.execute(select(Location.__table__.c.id))]
+    else:
+        location_ids = list(location_ids)
+        case_filters.append(cases.c.location_id.in_(location_ids))
+        reading_filters.append(readings.c.location_id.in_(location_ids))
+    if not location_ids:
+        return []
+
+    case_counts = {
+        location_id: (int(recent or 0), int(previous or 0))
+        for location_id, recent, previous in connection.execute(
+            select(
+                cases.c.location_id,
+                func.sum(case((cases.c.case_date >= recent_start, cases.c.num_cases), else_=0)),
+                func.sum(case((cases.c.case_date < recent_start, cases.c.num_cases), else_=0))
+            ).where(*case_filters).group_by(cases.c.location_id)
+        )
+    }
+
+    # Latest reading per location, found through the (location_id, timestamp) index
+    latest = select(
+        readings.c.location_id,
+        func.max(readings.c.timestamp).label('timestamp')
+    ).where(*reading_filters).group_by(readings.c.location_id).subquery()
+    latest_readings = {
+        row.location_id: row
+        for row in connection.execute(
+            select(readings).join(latest, and_(
+                readings.c.location_id == latest.c.location_id,
+                readings.c.timestamp == latest.c.timestamp
+            ))
+        )
+    }
+
+    rows = []
+    for location_id in location_ids:
+        recent, previous = case_counts.get(location_id, (0, 0))
+        reading = latest_readings.get(location_id)
+        cases_part = case_score(recent, previous)
+        water_part = water_score(reading.ph, reading.turbidity, reading.rainfall, reading.temperature) if reading else None
+        if water_part is None:
+            score = 100 * cases_part
+        else:
+            score = 100 * (CASE_WEIGHT * cases_part + WATER_WEIGHT * water_part)
+        rows.append({
+            'location_id': location_id,
+            'score': round(score, 1),
+            'level': risk_level(score),
+            'recent_cases': recent,
+            'previous_cases': previous,
+            'case_velocity': round(recent / CASE_WINDOW.days, 2),
+            'water_score': None if water_part is None else round(water_part, 3),
+            'reading_at': reading.timestamp if reading else None,
+            'updated_at': now
+        })
+    return rows
+
+
+def store(connection, rows):
+    """Replace the risk rows of the locations in rows."""
+    if not rows:
+        return
+    table = LocationRisk.__table__
+    connection.execute(table.delete().where(table.c.location_id.in_([row['location_id'] for row in rows])))
+    connection.execute(table.insert(), rows)
+
+
+def _touched_locations(session):
+    """New locations and locations whose cases or readings change in this flush."""
+    location_ids = {obj.id for obj in session.new if isinstance(obj, Location)}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Case, EnvironmentalData)):
+            location_ids.add(obj.location_id)
+            # A row moved to another location changes the old one too
+            location_ids.update(inspect(obj).attrs.location_id.history.deleted)
+    location_ids.discard(None)
+    return location_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_touched_locations(session, flush_context):
+    location_ids = _touched_locations(session)
+    if location_ids:
+        connection = session.connection()
+        store(connection, compute(connection, location_ids))
+
+
+def recompute():
+    """Recompute every location's score; returns the number of locations."""
+    connection = db.session.connection()
+    rows = compute(connection)
+    connection.execute(LocationRisk.__table__.delete())
+    if rows:
+        connection.execute(LocationRisk.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def ranked(limit=None, level=None):
+    """(LocationRisk, Location) pairs, highest score first."""
+    query = db.session.query(LocationRisk, Location).join(
+        Location, Location.id == LocationRisk.location_id
+    )
+    if level:
+        query = query.filter(LocationRisk.level == level)
+    query = query.order_by(LocationRisk.score.desc(), LocationRisk.location_id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def overall_water_quality():
+    """Label for the mean water score of locations with a current reading."""
+    return water_quality(db.session.query(func.avg(LocationRisk.water_score)).scalar())
+
+
+def scores_by_location():
+    """{location_id: LocationRisk} for the map."""
+    return {risk.location_id: risk for risk in LocationRisk.query.all()}
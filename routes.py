@@ -1,17 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, current_app, send_file
 from flask_login import login_user, logout_user, login_required, current_user
-from .models import db, User, Case, Disease, Location, Alert, EnvironmentalData, Recipient, SMSHistory
+from sqlalchemy import and_, func
+from sqlalchemy.orm import joinedload
+from .models import db, User, Case, Disease, Location, Alert, EnvironmentalData, Recipient, SMSHistory, LocationRisk, Region
+from .clustering import cluster_index
+from .heatmap import heatmap_cache
+from .geo import resolve_target_locations, recipients_for_locations
+from .broadcast import BroadcastPlan
+from .counters import get_stats
+from .history import query_sms_history
+from . import symptom_index
+from .classifier import UNCONFIRMED_DISEASE, classify_text, get_model, save_classifications, unconfirmed_disease_id
+from .exports import DATASETS, FORMATS, stream_export
+from .recipient_import import import_recipients, location_summary
+from .sync import sync as sync_reports
+from . import profiling, reference, risk, regions
+from .forecasting import DEFAULT_HORIZON, forecasts_for
+from .suppression import recently_notified, submit_alert, suppression_counts
+from .live import SOURCES as LIVE_SOURCES, STREAM_LIFETIME, STREAMS_ENABLED, hub as live_hub, format_event
+from .sms import get_provider as get_sms_provider
+import csv
+import io
 import json
 import os
-
-# Try to import Twilio, but make it optional
-try:
-    from twilio.rest import Client
-    TWILIO_AVAILABLE = True
-    print("✅ Twilio imported successfully - SMS features enabled")
-except ImportError as e:
-    TWILIO_AVAILABLE = False
-    print(f"⚠️ Warning: Twilio not installed. SMS features will be disabled. Error: {e}")
+import queue
+import time
+from datetime import date, datetime
 
 main = Blueprint('main', __name__)
 
@@ -87,6 +101,10 @@ def register():
         
     return render_template('register.html')
 
+def _reportable_diseases():
+    """Diseases users pick from or see counted, without the Unconfirmed placeholder"""
+    return [disease for disease in reference.diseases() if disease.name != UNCONFIRMED_DISEASE]
+
 @main.route('/dashboard')
 @login_required
 def dashboard():
@@ -103,31 +121,19 @@ def dashboard():
     
     active_hotspots = active_locations
     
-    # Calculate overall water quality based on environmental data
-    # This is simplified - in a real app, this would be more complex
-    env_data = EnvironmentalData.query.order_by(EnvironmentalData.timestamp.desc()).first()
-    
-    if env_data and env_data.ph:
-        if 6.5 <= env_data.ph <= 7.5:
-            overall_water_quality = 'Good'
-        elif 6.0 <= env_data.ph <= 8.0:
-            overall_water_quality = 'Fair'
-        else:
-            overall_water_quality = 'Poor'
-    else:
-        overall_water_quality = 'Unknown'
-    
-    # Get all diseases
-    diseases = Disease.query.all()
+    # Water quality across every location with a current reading, from the risk table
+    overall_water_quality = risk.overall_water_quality()
+    top_risks = [
+        {'name': location.name, 'score': location_risk.score, 'level': location_risk.level}
+        for location_risk, location in risk.ranked(limit=5)
+    ]
     
-    # Create case distribution data
-    labels = []
-    data = []
+    # Case distribution per disease from one grouped query
+    counts = dict(db.session.query(Case.disease_id, func.count(Case.id)).group_by(Case.disease_id).all())
+    diseases = _reportable_diseases()
     
-    for disease in diseases:
-        labels.append(disease.name)
-        count = Case.query.filter_by(disease_id=disease.id).count()
-        data.append(count)
+    labels = [disease.name for disease in diseases]
+    data = [counts.get(disease.id, 0) for disease in diseases]
     
     case_data = {
         "labels": labels,
@@ -141,6 +147,7 @@ def dashboard():
                           live_cases=live_cases,
                           active_hotspots=active_hotspots,
                           overall_water_quality=overall_water_quality,
+                          top_risks=top_risks,
                           case_data=json.dumps(case_data),
                           now=now)
 
@@ -161,6 +168,11 @@ def report_case():
             db.session.add(location)
             db.session.commit()
 
+        # Reports without a diagnosis are filed as unconfirmed and get a suggested disease
+        unconfirmed = not disease_id
+        if unconfirmed:
+            disease_id = unconfirmed_disease_id()
+
         new_case = Case(
             disease_id=disease_id,
             location_id=location.id,
@@ -170,56 +182,269 @@ def report_case():
         )
         db.session.add(new_case)
         db.session.commit()
+        
+        if unconfirmed:
+            suggestion = classify_text(symptoms)
+            save_classifications([(new_case.id, suggestion['disease_id'], suggestion['score'])], get_model().version)
+            db.session.commit()
+            if suggestion['disease']:
+                flash(f"Symptoms most resemble {suggestion['disease']}.")
         flash('Case reported successfully!')
         return redirect(url_for('main.dashboard'))
 
-    diseases = Disease.query.all()
+    diseases = _reportable_diseases()
     return render_template('report.html', diseases=diseases)
 
+@main.route('/api/classify', methods=['POST'])
+@login_required
+def classify_symptoms():
+    symptoms = request.form.get('symptoms') or (request.get_json(silent=True) or {}).get('symptoms')
+    
+    if not symptoms:
+        return jsonify({'success': False, 'message': 'Symptoms are required'}), 400
+    
+    return jsonify({'success': True, **classify_text(symptoms)})
+
+@main.route('/api/sync', methods=['POST'])
+@login_required
+def sync_field_reports():
+    payload = request.get_json(silent=True)
+    
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON body'}), 400
+    
+    try:
+        result = sync_reports(current_user.id, payload)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, **result})
+
 @main.route('/map')
 @login_required
 def map_view():
     from datetime import datetime
     
-    # Get all cases with their related data
-    cases = Case.query.all()
+    # Totals per coordinate pair in one grouped query instead of loading every case
+    totals = db.session.query(
+        Location.latitude,
+        Location.longitude,
+        func.min(Location.name),
+        func.sum(Case.num_cases),
+        func.max(Case.case_date),
+        func.max(LocationRisk.score)
+    ).join(
+        Case, Case.location_id == Location.id
+    ).outerjoin(
+        LocationRisk, LocationRisk.location_id == Location.id
+    ).group_by(Location.latitude, Location.longitude).all()
+    
+    # Disease of the most recent case at each coordinate pair
+    latest = db.session.query(
+        Location.latitude.label('latitude'),
+        Location.longitude.label('longitude'),
+        func.max(Case.case_date).label('case_date')
+    ).join(
+        Case, Case.location_id == Location.id
+    ).group_by(Location.latitude, Location.longitude).subquery()
+    latest_disease = {
+        (latitude, longitude): name
+        for latitude, longitude, name in db.session.query(
+            Location.latitude, Location.longitude, Disease.name
+        ).join(
+            Case, Case.location_id == Location.id
+        ).join(
+            Disease, Case.disease_id == Disease.id
+        ).join(latest, and_(
+            latest.c.latitude == Location.latitude,
+            latest.c.longitude == Location.longitude,
+            latest.c.case_date == Case.case_date
+        ))
+    }
     
-    # Group cases by location for the map
     case_locations = []
-    case_by_location = {}
-    
-    for case in cases:
-        loc_key = f"{case.location.latitude}:{case.location.longitude}"
-        
-        if loc_key in case_by_location:
-            case_by_location[loc_key]['cases'] += case.num_cases
-            # Update the disease if needed (in a real app, this would be more complex)
-            if case.case_date > case_by_location[loc_key]['updated_date']:
-                case_by_location[loc_key]['disease'] = case.disease.name
-                case_by_location[loc_key]['updated_date'] = case.case_date
-        else:
-            case_by_location[loc_key] = {
-                'lat': case.location.latitude,
-                'lng': case.location.longitude,
-                'name': case.location.name if case.location.name else f"Location at {case.location.latitude:.4f}, {case.location.longitude:.4f}",
-                'disease': case.disease.name,
-                'cases': case.num_cases,
-                'updated_date': case.case_date
-            }
-    
-    # Convert dictionary to list for template
-    for loc_data in case_by_location.values():
-        loc_data['updated'] = loc_data['updated_date'].strftime('%b %d, %Y')
-        del loc_data['updated_date']  # Remove the datetime object before JSON serialization
-        case_locations.append(loc_data)
+    for latitude, longitude, name, cases, updated, score in totals:
+        case_locations.append({
+            'lat': latitude,
+            'lng': longitude,
+            'name': name if name else f"Location at {latitude:.4f}, {longitude:.4f}",
+            'disease': latest_disease.get((latitude, longitude)),
+            'cases': int(cases or 0),
+            'updated': updated.strftime('%b %d, %Y') if updated else '',
+            'risk': score or 0,
+            'risk_level': risk.risk_level(score or 0)
+        })
         
-    # Sort by number of cases, descending
-    case_locations.sort(key=lambda x: x['cases'], reverse=True)
+    # Sort by risk score, then number of cases, descending
+    case_locations.sort(key=lambda x: (x['risk'], x['cases']), reverse=True)
     
     return render_template('map_view.html', 
                           case_locations=case_locations,
                           caseLocations=case_locations)
 
+@main.route('/api/risk')
+@login_required
+def location_risk():
+    level = request.args.get('level')
+    try:
+        limit = min(int(request.args.get('limit', 50)), 1000)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+    
+    return jsonify({
+        'success': True,
+        'locations': [{
+            'location_id': location.id,
+            'name': location.name,
+            'latitude': location.latitude,
+            'longitude': location.longitude,
+            'score': location_risk.score,
+            'level': location_risk.level,
+            'recent_cases': location_risk.recent_cases,
+            'case_velocity': location_risk.case_velocity,
+            'water_score': location_risk.water_score,
+            'water_quality': risk.water_quality(location_risk.water_score),
+            'updated_at': location_risk.updated_at.isoformat()
+        } for location_risk, location in risk.ranked(limit=limit, level=level)]
+    })
+
+@main.route('/events')
+@login_required
+def live_events():
+    kinds = set(filter(None, request.args.get('types', ','.join(LIVE_SOURCES)).split(',')))
+    if not kinds or kinds - set(LIVE_SOURCES):
+        return jsonify({'success': False, 'message': f"types must be from: {', '.join(LIVE_SOURCES)}"}), 400
+    
+    if not STREAMS_ENABLED:
+        return jsonify({'success': False, 'message': 'Live updates need threaded workers (GUNICORN_WORKER_CLASS=gthread)'}), 503
+    
+    subscriber = live_hub.subscribe(current_app._get_current_object(), kinds)
+    if subscriber is None:
+        return jsonify({'success': False, 'message': 'Too many live streams, try again later'}), 503
+    
+    def stream():
+        # Streams end before the worker timeout; EventSource reconnects on its own
+        deadline = time.monotonic() + STREAM_LIFETIME
+        try:
+            yield "retry: 5000\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    yield format_event(subscriber.get(timeout=15))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            live_hub.unsubscribe(subscriber)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main.route('/api/map/clusters')
+@login_required
+def map_clusters():
+    zoom = request.args.get('zoom', type=int)
+    bbox = request.args.get('bbox', '')
+    
+    if zoom is None or zoom < 0:
+        return jsonify({'success': False, 'message': 'A non-negative zoom level is required'}), 400
+    
+    try:
+        west, south, east, north = [float(value) for value in bbox.split(',')]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'bbox must be west,south,east,north'}), 400
+    
+    clusters = cluster_index.get_clusters(zoom, west, south, east, north)
+    
+    return jsonify({
+        'success': True,
+        'zoom': zoom,
+        'clusters': clusters
+    })
+
+@main.route('/api/map/heatmap')
+@login_required
+def map_heatmap():
+    disease_id = request.args.get('disease_id', type=int)
+    days = request.args.get('days', type=int)
+    zoom = request.args.get('zoom', 6, type=int)
+    output_format = request.args.get('format', 'png')
+    
+    if output_format not in ('png', 'bin'):
+        return jsonify({'success': False, 'message': 'format must be png or bin'}), 400
+    
+    heatmap = heatmap_cache.get(disease_id=disease_id, days=days, zoom=zoom)
+    
+    if output_format == 'png':
+        response = Response(heatmap['png'], mimetype='image/png')
+    else:
+        response = Response(heatmap['bin'], mimetype='application/octet-stream')
+        response.headers['Content-Encoding'] = 'gzip'
+    
+    # Raster placement and scale for the client overlay
+    response.headers['X-Heatmap-Bounds'] = ','.join(f"{value:.6f}" for value in heatmap['bounds'])
+    response.headers['X-Heatmap-Size'] = f"{heatmap['width']}x{heatmap['height']}"
+    response.headers['X-Heatmap-Peak'] = f"{heatmap['peak']:.4f}"
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+def _parse_date_args():
+    """Read optional since/until (YYYY-MM-DD) query arguments; raises ValueError"""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    try:
+        return (date.fromisoformat(since) if since else None,
+                date.fromisoformat(until) if until else None)
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+
+@main.route('/api/symptoms/search')
+@login_required
+def symptom_search():
+    text = request.args.get('q', '')
+    location_id = request.args.get('location_id', type=int)
+    limit = request.args.get('limit', symptom_index.DEFAULT_RESULTS, type=int)
+    include_archived = request.args.get('archived') == '1'
+    
+    if not text.strip():
+        return jsonify({'success': False, 'message': 'A search query is required'}), 400
+    
+    try:
+        since, until = _parse_date_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    results = symptom_index.search(text, location_id=location_id, since=since, until=until, limit=limit,
+                                   include_archived=include_archived)
+    
+    return jsonify({
+        'success': True,
+        'terms': symptom_index.tokenize(text),
+        'results': results
+    })
+
+@main.route('/api/symptoms/weekly')
+@login_required
+def symptom_weekly():
+    text = request.args.get('q', '')
+    location_id = request.args.get('location_id', type=int)
+    include_archived = request.args.get('archived') == '1'
+    
+    if not text.strip():
+        return jsonify({'success': False, 'message': 'A search query is required'}), 400
+    
+    try:
+        since, until = _parse_date_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'terms': symptom_index.tokenize(text),
+        'weeks': symptom_index.weekly_counts(text, location_id=location_id, since=since, until=until,
+                                             include_archived=include_archived)
+    })
+
 @main.route('/trends')
 @login_required
 def trends():
@@ -250,6 +475,9 @@ def trends():
         }
     }
     
+    # Regions panel from the state rollups, once locations are assigned to regions
+    trend_data["regions"] = regions.trends_panel() or trend_data["regions"]
+    
     # Get current datetime for template
     now = datetime.now()
     
@@ -257,6 +485,53 @@ def trends():
                           trend_data=json.dumps(trend_data),
                           now=now)
 
+@main.route('/api/regions')
+@main.route('/api/regions/<int:region_id>')
+@login_required
+def region_summaries(region_id=None):
+    weeks = request.args.get('weeks', 12, type=int)
+    disease_id = request.args.get('disease_id', type=int)
+    if not 1 <= weeks <= 104:
+        return jsonify({'success': False, 'message': 'weeks must be between 1 and 104'}), 400
+    
+    if region_id is None:
+        return jsonify({'success': True, 'level': 'state', 'regions': regions.summaries(weeks=weeks, disease_id=disease_id)})
+    
+    region = Region.query.get(region_id)
+    if not region:
+        return jsonify({'success': False, 'message': 'Region not found'}), 404
+    
+    # Districts drill down to their villages; states to their districts
+    children = regions.summaries(region.id, weeks, disease_id)
+    if region.level == 'district' or not children:
+        children = regions.village_summaries(region.id, weeks, disease_id)
+    
+    return jsonify({
+        'success': True,
+        'region': {'id': region.id, 'name': region.name, 'level': region.level, 'parent_id': region.parent_id},
+        'weekly': [{'week': week.isoformat(), 'cases': cases} for week, cases in regions.weekly(region.id, weeks, disease_id)],
+        'regions': children
+    })
+
+@main.route('/api/forecast')
+@login_required
+def case_forecast():
+    location_id = request.args.get('location_id', type=int)
+    disease_id = request.args.get('disease_id', type=int)
+    days = request.args.get('days', DEFAULT_HORIZON, type=int)
+    if not 1 <= days <= DEFAULT_HORIZON:
+        return jsonify({'success': False, 'message': f'days must be between 1 and {DEFAULT_HORIZON}'}), 400
+    
+    return jsonify({
+        'success': True,
+        'forecast': [{
+            'date': forecast_date.isoformat(),
+            'expected': round(expected, 1),
+            'lower': round(lower, 1),
+            'upper': round(upper, 1)
+        } for forecast_date, expected, lower, upper in forecasts_for(location_id, disease_id, days)]
+    })
+
 @main.route('/admin')
 @login_required
 def admin():
@@ -265,11 +540,12 @@ def admin():
         return redirect(url_for('main.dashboard'))
     
     users = User.query.all()
-    diseases = Disease.query.all()
-    locations = Location.query.all()
-    cases = Case.query.all()
-    alerts = Alert.query.all()
-    env_data = EnvironmentalData.query.all()
+    diseases = reference.diseases()
+    locations = reference.locations()
+    # Load the related rows the tables show up front rather than one query per row
+    cases = Case.query.options(joinedload(Case.disease), joinedload(Case.location), joinedload(Case.user)).all()
+    alerts = Alert.query.options(joinedload(Alert.location)).all()
+    env_data = EnvironmentalData.query.options(joinedload(EnvironmentalData.location)).all()
     
     return render_template('admin.html', 
                           users=users, 
@@ -279,6 +555,41 @@ def admin():
                           alerts=alerts,
                           env_data=env_data)
 
+@main.route('/export/<dataset>')
+@login_required
+def export_data(dataset):
+    if current_user.role not in ('admin', 'analyst'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    output_format = request.args.get('format', 'csv')
+    compress = request.args.get('gzip') == '1'
+    include_archived = request.args.get('archived') == '1'
+    
+    if dataset not in DATASETS:
+        return jsonify({'success': False, 'message': f"Unknown dataset. Choose from: {', '.join(DATASETS)}"}), 404
+    if output_format not in FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    
+    try:
+        since, until = _parse_date_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    filters = {
+        'since': since,
+        'until': until,
+        'location_id': request.args.get('location_id', type=int),
+        'disease_id': request.args.get('disease_id', type=int)
+    }
+    
+    filename = f"{dataset}-{datetime.now():%Y%m%d}.{output_format}" + ('.gz' if compress else '')
+    response = Response(
+        stream_with_context(stream_export(dataset, output_format, filters, compress, include_archived)),
+        mimetype='application/gzip' if compress else FORMATS[output_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @main.route('/admin/add_disease', methods=['POST'])
 @login_required
 def add_disease():
@@ -286,13 +597,15 @@ def add_disease():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     name = request.form.get('name')
-    symptoms = request.form.get('symptoms')
+    # Older forms post the description as 'symptoms'
+    description = request.form.get('description') or request.form.get('symptoms')
     
     if not name:
         return jsonify({'success': False, 'message': 'Disease name is required'}), 400
     
-    new_disease = Disease(name=name, symptoms=symptoms)
+    new_disease = Disease(name=name, description=description)
     db.session.add(new_disease)
+    reference.bump('diseases')
     db.session.commit()
     
     return jsonify({
@@ -315,7 +628,18 @@ def add_location():
         return jsonify({'success': False, 'message': 'All fields are required'}), 400
     
     new_location = Location(name=name, latitude=latitude, longitude=longitude)
+    
+    # Optional place in the region hierarchy
+    state = (request.form.get('state') or '').strip()
+    district = (request.form.get('district') or '').strip()
+    if state:
+        region = regions.get_or_create(state, 'state')
+        if district:
+            region = regions.get_or_create(district, 'district', region)
+        new_location.region_id = region.id
+    
     db.session.add(new_location)
+    reference.bump('locations')
     db.session.commit()
     
     return jsonify({
@@ -325,10 +649,67 @@ def add_location():
             'id': new_location.id, 
             'name': new_location.name,
             'latitude': new_location.latitude,
-            'longitude': new_location.longitude
+            'longitude': new_location.longitude,
+            'region_id': new_location.region_id
         }
     })
     
+@main.route('/admin/add_environmental_data', methods=['POST'])
+@login_required
+def add_environmental_data():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    location_id = request.form.get('location_id', type=int)
+    readings = {
+        name: request.form.get(name, type=float)
+        for name in ('rainfall', 'turbidity', 'ph', 'temperature')
+    }
+    
+    if not location_id or not reference.location(location_id):
+        return jsonify({'success': False, 'message': 'A valid location is required'}), 400
+    if all(value is None for value in readings.values()):
+        return jsonify({'success': False, 'message': 'At least one reading is required'}), 400
+    
+    # Flushing the reading also updates the location's risk score
+    db.session.add(EnvironmentalData(location_id=location_id, **readings))
+    db.session.commit()
+    
+    location_risk = LocationRisk.query.get(location_id)
+    return jsonify({
+        'success': True,
+        'message': 'Environmental data added successfully',
+        'risk': {'score': location_risk.score, 'level': location_risk.level}
+    })
+
+@main.route('/admin/import_recipients', methods=['POST'])
+@login_required
+def import_recipients_upload():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'message': 'A CSV file is required'}), 400
+    
+    deactivate_missing = request.form.get('keep_missing') != '1'
+    try:
+        result = import_recipients(
+            io.TextIOWrapper(upload.stream, encoding='utf-8-sig'),
+            deactivate_missing=deactivate_missing
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Chunks before the unreadable part are already imported; nothing is deactivated
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'The file could not be read as a UTF-8 CSV ({e}); rows before the problem were imported'}), 400
+    
+    return jsonify({
+        'success': True,
+        'message': f"Imported {result['inserted']} new and {result['updated']} updated recipients",
+        'result': result,
+        'summary': [{'location': name, 'recipients': count} for name, count in location_summary()]
+    })
+
 @main.route('/admin/create_alert', methods=['POST'])
 @login_required
 def create_alert():
@@ -341,21 +722,76 @@ def create_alert():
     
     if not message or not severity or not location_id:
         return jsonify({'success': False, 'message': 'All fields are required'}), 400
+    if not location_id.isdigit() or not reference.location(int(location_id)):
+        return jsonify({'success': False, 'message': 'Unknown location'}), 400
     
-    new_alert = Alert(
-        message=message,
-        severity=severity,
-        location_id=location_id,
-        created_by=current_user.id
-    )
-    db.session.add(new_alert)
+    # Repeats within the alert window are merged into the open alert
+    alert, outcome = submit_alert(location_id, severity, message, created_by=current_user.id)
     db.session.commit()
     
+    messages = {
+        'created': 'Alert created successfully',
+        'escalated': f'Open alert escalated to {severity}',
+        'suppressed': 'A matching alert is already open; this one was merged into it'
+    }
     return jsonify({
         'success': True, 
-        'message': 'Alert created successfully'
+        'message': messages[outcome],
+        'outcome': outcome,
+        'alert_id': alert.id if alert else None
     })
 
+@main.route('/api/alerts/suppression')
+@login_required
+def alert_suppression():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    hours = request.args.get('hours', 24, type=int)
+    if not 1 <= hours <= 24 * 90:
+        return jsonify({'success': False, 'message': 'hours must be between 1 and 2160'}), 400
+    
+    return jsonify({'success': True, **suppression_counts(hours)})
+
+@main.route('/admin/profiles')
+@login_required
+def profile_runs():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    # Add ?_profile=1 to any URL (or send X-Profile: 1) to record a run
+    return jsonify({'success': True, 'runs': profiling.runs()})
+
+@main.route('/admin/profiles/<name>')
+@login_required
+def profile_run(name):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    output = request.args.get('format', 'json')
+    if output == 'prof':
+        path = profiling.prof_path(name)
+        if not path:
+            return jsonify({'success': False, 'message': 'Profile not found'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name + '.prof')
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in profiling.SORT_KEYS:
+        return jsonify({'success': False, 'message': f"sort must be one of {', '.join(profiling.SORT_KEYS)}"}), 400
+    limit = min(max(request.args.get('limit', 40, type=int), 1), 500)
+    
+    run = profiling.load(name, sort=sort, limit=limit)
+    if run is None:
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    summary, stats = run
+    
+    if output == 'text':
+        lines = [f"{summary['method']} {summary['path']} -> {summary['status']} in {summary['ms']} ms "
+                 f"({summary['sql_count']} SQL statements, {summary['sql_ms']} ms)", '']
+        lines += [f"{statement['ms']:>10.3f} ms  {statement['sql']}" for statement in summary['statements']]
+        return Response('\n'.join(lines) + '\n\n' + stats, mimetype='text/plain')
+    return jsonify({'success': True, **summary, 'stats': stats})
+
 @main.route('/sms-alerts')
 @login_required
 def sms_alerts():
@@ -364,44 +800,107 @@ def sms_alerts():
         return redirect(url_for('main.dashboard'))
     
     # Get locations and diseases for the form
-    locations = Location.query.all()
-    diseases = Disease.query.all()
-    
-    # Get SMS history from database with explicit join conditions
-    sms_history = db.session.query(
-        SMSHistory.id,
-        SMSHistory.message,
-        SMSHistory.alert_type,
-        SMSHistory.status,
-        SMSHistory.sent_at,
-        Recipient.name.label('recipient_name'),
-        Recipient.phone_number,
-        Location.name.label('location_name')
-    ).join(
-        Recipient, SMSHistory.recipient_id == Recipient.id
-    ).join(
-        Location, Recipient.location_id == Location.id
-    ).order_by(SMSHistory.sent_at.desc()).limit(50).all()
+    locations = reference.locations()
+    diseases = _reportable_diseases()
+    
+    # Latest page of SMS history; older pages come from /api/sms-history
+    sms_history, next_cursor = query_sms_history()
     
-    # Get statistics
-    total_sent = SMSHistory.query.count()
-    delivered = SMSHistory.query.filter_by(status='delivered').count()
-    total_recipients = Recipient.query.filter_by(is_active=True).count()
-    active_alerts = Alert.query.count()
+    # Get statistics from the incrementally maintained counters
+    counters = get_stats()
     
     stats = {
-        'total_sent': total_sent,
-        'delivered': delivered,
-        'recipients': total_recipients,
-        'active_alerts': active_alerts
+        'total_sent': counters['sms_total'],
+        'delivered': counters['sms_delivered'],
+        'recipients': counters['recipients_active'],
+        'active_alerts': counters['alerts_total']
     }
     
     return render_template('sms_alerts.html', 
                          locations=locations,
                          diseases=diseases,
                          sms_history=sms_history,
+                         next_cursor=next_cursor,
                          stats=stats)
 
+@main.route('/api/sms-history')
+@login_required
+def sms_history_api():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        rows, next_cursor = query_sms_history(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            status=request.args.get('status'),
+            alert_type=request.args.get('alert_type'),
+            location_id=request.args.get('location_id', type=int),
+            phone=request.args.get('phone'),
+            search=request.args.get('q')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'items': [{
+            'id': row.id,
+            'message': row.message,
+            'alert_type': row.alert_type,
+            'status': row.status,
+            'sent_at': row.sent_at.isoformat() if row.sent_at else None,
+            'recipient_name': row.recipient_name,
+            'phone_number': row.phone_number,
+            'location_name': row.location_name
+        } for row in rows],
+        'next_cursor': next_cursor
+    })
+
+def _resolve_recipients(location_id, form):
+    """Return (recipients, location_name) for a broadcast target; raises ValueError on bad input"""
+    # Get recipients from database based on location
+    if location_id == 'all':
+        recipients = Recipient.query.filter_by(is_active=True).all()
+        location_name = 'All Villages'
+    elif location_id in ('radius', 'polygon'):
+        # Geographic targeting spans every location inside the area
+        location_ids, location_name = resolve_target_locations(location_id, form)
+        recipients = recipients_for_locations(location_ids)
+    else:
+        recipients = Recipient.query.filter_by(
+            location_id=int(location_id), 
+            is_active=True
+        ).all()
+        location = reference.location(int(location_id))
+        location_name = location.name if location else 'Unknown'
+    return recipients, location_name
+
+@main.route('/send-sms-alert/preview', methods=['POST'])
+@login_required
+def preview_sms_alert():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    location_id = request.form.get('location_id')
+    sms_message = request.form.get('message')
+    
+    if not sms_message or not location_id:
+        return jsonify({'success': False, 'message': 'Location and message are required'}), 400
+    
+    try:
+        recipients, location_name = _resolve_recipients(location_id, request.form)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    plan = BroadcastPlan(recipients, sms_message)
+    
+    return jsonify({
+        'success': True,
+        'location': location_name,
+        'preview': plan.preview()
+    })
+
 @main.route('/send-sms-alert', methods=['POST'])
 @login_required
 def send_sms_alert():
@@ -418,53 +917,39 @@ def send_sms_alert():
         return redirect(url_for('main.sms_alerts'))
     
     try:
-        # Get recipients from database based on location
-        if location_id == 'all':
-            recipients = Recipient.query.filter_by(is_active=True).all()
-            location_name = 'All Villages'
-        else:
-            recipients = Recipient.query.filter_by(
-                location_id=int(location_id), 
-                is_active=True
-            ).all()
-            location = Location.query.get(location_id)
-            location_name = location.name if location else 'Unknown'
+        try:
+            recipients, location_name = _resolve_recipients(location_id, request.form)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('main.sms_alerts'))
         
         if not recipients:
             flash('No recipients found for the selected location.', 'warning')
             return redirect(url_for('main.sms_alerts'))
         
-        # Check if Twilio is available
-        print(f"🔍 DEBUG: TWILIO_AVAILABLE = {TWILIO_AVAILABLE}")
-        if not TWILIO_AVAILABLE:
-            print("❌ Twilio check failed - showing error message")
-            flash('⚠️ SMS service not configured. Please install Twilio: pip install twilio', 'error')
+        # Twilio, an HTTP gateway or the local fake gateway, per SMS_PROVIDER
+        provider = get_sms_provider()
+        problem = provider.problem()
+        if problem:
+            flash(problem, 'error')
             return redirect(url_for('main.sms_alerts'))
         
-        print("✅ Twilio check passed - proceeding to send SMS")
+        # Skip recipients who already got this exact message within the alert window
+        already_sent = recently_notified([recipient.id for recipient in recipients], sms_message)
+        if already_sent:
+            recipients = [recipient for recipient in recipients if recipient.id not in already_sent]
+            flash(f'Skipped {len(already_sent)} recipient(s) who already received this message.', 'warning')
+            if not recipients:
+                return redirect(url_for('main.sms_alerts'))
         
-        # Twilio SMS Integration - Load credentials from environment variables
-        account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-        messaging_service_sid = os.environ.get('TWILIO_MESSAGING_SERVICE_SID')
-        
-        if not all([account_sid, auth_token, messaging_service_sid]):
-            flash('⚠️ Twilio credentials not configured. Please set TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, and TWILIO_MESSAGING_SERVICE_SID in your .env file.', 'error')
-            return redirect(url_for('main.sms_alerts'))
-        
-        client = Client(account_sid, auth_token)
-        
-        # Send SMS to each recipient
+        # Send one SMS per unique number, however many locations it is registered at
+        plan = BroadcastPlan(recipients, sms_message)
         sent_count = 0
         failed_count = 0
         
-        for recipient in recipients:
+        for phone_number, recipient in plan.targets.items():
             try:
-                message = client.messages.create(
-                    messaging_service_sid=messaging_service_sid,
-                    body=sms_message,
-                    to=recipient.phone_number
-                )
+                message_id = provider.send(phone_number, sms_message)
                 
                 # Save to SMS history
                 sms_history = SMSHistory(
@@ -473,15 +958,15 @@ def send_sms_alert():
                     alert_type=alert_type,
                     status='sent',
                     sent_by=current_user.id,
-                    twilio_sid=message.sid
+                    twilio_sid=message_id
                 )
                 db.session.add(sms_history)
                 
-                print(f"✅ SMS sent to {recipient.name} ({recipient.phone_number}): {message.sid}")
+                print(f"✅ SMS sent to {recipient.name} ({phone_number}) via {provider.name}: {message_id}")
                 sent_count += 1
                 
             except Exception as sms_error:
-                print(f"❌ Error sending to {recipient.name} ({recipient.phone_number}): {str(sms_error)}")
+                print(f"❌ Error sending to {recipient.name} ({phone_number}): {str(sms_error)}")
                 
                 # Save failed attempt to history
                 sms_history = SMSHistory(
@@ -501,6 +986,8 @@ def send_sms_alert():
             flash(f'✅ SMS alert sent successfully to {sent_count} recipient(s) in {location_name}!', 'success')
         if failed_count > 0:
             flash(f'⚠️ {failed_count} SMS(s) failed to send.', 'warning')
+        if plan.invalid:
+            flash(f'⚠️ Skipped {len(plan.invalid)} recipient(s) with invalid phone numbers.', 'warning')
         
     except Exception as e:
         db.session.rollback()
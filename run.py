@@ -1,6 +1,7 @@
 from app import create_app, db
 from app.models import User, Disease, Location
 import os
+import click
 
 app = create_app()
 
@@ -37,7 +38,8 @@ def init_db():
         {'name': 'Typhoid', 'description': 'Bacterial infection caused by Salmonella typhi spread through contaminated food and water'},
         {'name': 'Hepatitis A', 'description': 'Liver infection caused by a virus spread through contaminated food and water'},
         {'name': 'Giardiasis', 'description': 'Intestinal infection caused by Giardia parasite found in soil, food, or water contaminated with feces'},
-        {'name': 'Dysentery', 'description': 'Infection resulting in inflammation of the intestines, especially the colon'}
+        {'name': 'Dysentery', 'description': 'Infection resulting in inflammation of the intestines, especially the colon'},
+        {'name': 'Unconfirmed', 'description': 'Reported illness awaiting diagnosis; a disease is suggested from the symptoms'}
     ]
     
     for disease_data in diseases:
@@ -60,7 +62,10 @@ def init_db():
             location = Location(**location_data)
             db.session.add(location)
             print(f"Added {location_data['name']} to locations.")
-            
+    
+    if any(isinstance(obj, (Disease, Location)) for obj in db.session.new):
+        from app import reference
+        reference.bump_all()
     db.session.commit()
     print("Default data added successfully.")
 
@@ -101,6 +106,126 @@ def reset_password():
     db.session.commit()
     print(f"Password for {username} has been reset.")
 
+@app.cli.command("recount-stats")
+def recount_stats():
+    """Recount the SMS statistics counters from their source tables."""
+    from app.counters import recount, get_stats
+    recount()
+    for name, value in get_stats().items():
+        print(f"{name}: {value}")
+
+@app.cli.command("reindex-symptoms")
+def reindex_symptoms():
+    """Rebuild the symptom search index from all cases."""
+    from app.symptom_index import rebuild
+    indexed = rebuild()
+    print(f"Indexed symptoms of {indexed} cases.")
+
+@app.cli.command("recompute-risk")
+def recompute_risk():
+    """Recompute the risk score of every location."""
+    from app.risk import recompute, ranked
+    scored = recompute()
+    print(f"Scored {scored} locations.")
+    for location_risk, location in ranked(limit=10):
+        print(f"{location_risk.score:6.1f}  {location_risk.level:<6}  {location.name}")
+
+@app.cli.command("rebuild-region-rollups")
+@click.option("--assign-nearest", "assign_km", type=float, help="First give unassigned locations the region of the nearest assigned one within this many km.")
+def rebuild_region_rollups(assign_km):
+    """Recompute the per-region weekly case rollups."""
+    from app.regions import assign_nearest, rebuild
+    if assign_km:
+        print(f"Assigned {assign_nearest(assign_km)} locations to regions.")
+    rows = rebuild()
+    print(f"Wrote {rows} rollup rows.")
+
+@app.cli.command("rebuild-water-stats")
+def rebuild_water_stats():
+    """Recompute the per-location water-quality statistics from every reading."""
+    from app.anomaly import rebuild
+    readings = rebuild()
+    print(f"Replayed {readings} readings.")
+
+@app.cli.command("forecast")
+@click.option("--all", "refit_all", is_flag=True, help="Refit every series, not only changed ones.")
+@click.option("--horizon", default=14, show_default=True, help="Days to forecast.")
+def forecast(refit_all, horizon):
+    """Refit case forecasts for location x disease series whose cases changed."""
+    from app.forecasting import run_forecasts
+    result = run_forecasts(horizon=horizon, refit_all=refit_all)
+    print(f"{result['series']} series, {result['refitted']} refitted, {result['dropped']} dropped.")
+
+@app.cli.command("classify-cases")
+@click.option("--all", "include_confirmed", is_flag=True, help="Also score cases with a confirmed disease.")
+@click.option("--batch-size", default=500, show_default=True, help="Cases scored per batch.")
+def classify_cases(include_confirmed, batch_size):
+    """Suggest diseases for unconfirmed case reports from their symptoms."""
+    from app.classifier import reclassify_backlog
+    scored, classified = reclassify_backlog(batch_size=batch_size, include_confirmed=include_confirmed)
+    print(f"Scored {scored} cases, {classified} matched a disease.")
+
+@app.cli.command("export")
+@click.argument("dataset", type=click.Choice(["cases", "environmental", "sms_history"]))
+@click.option("--format", "output_format", type=click.Choice(["csv", "ndjson"]), default="csv", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="File to write (default: stdout).")
+@click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), help="First day to include.")
+@click.option("--until", type=click.DateTime(formats=["%Y-%m-%d"]), help="Last day to include.")
+@click.option("--location-id", type=int)
+@click.option("--disease-id", type=int)
+@click.option("--gzip", "compress", is_flag=True, help="Gzip the output.")
+@click.option("--archived", "include_archived", is_flag=True, help="Include archived rows.")
+def export(dataset, output_format, output, since, until, location_id, disease_id, compress, include_archived):
+    """Stream a dataset to CSV or NDJSON."""
+    from app.exports import stream_export
+    filters = {
+        'since': since.date() if since else None,
+        'until': until.date() if until else None,
+        'location_id': location_id,
+        'disease_id': disease_id
+    }
+    stream = open(output, 'wb') if output else click.get_binary_stream('stdout')
+    try:
+        for chunk in stream_export(dataset, output_format, filters, compress, include_archived):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+
+@app.cli.command("archive")
+@click.option("--days", default=365, show_default=True, help="Archive rows older than this many days.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows moved per transaction.")
+@click.option("--table", "tables", multiple=True, type=click.Choice(["case", "alert", "sms_history"]),
+              help="Limit to these tables (default: all).")
+def archive(days, batch_size, tables):
+    """Move old cases, alerts and SMS history into the archive tables."""
+    from datetime import datetime, timedelta
+    from app.archive import archive_all, archived_counts
+    # Whole days keep the horizon stable, so a rerun the same day resumes
+    horizon = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
+    print(f"Archiving rows older than {horizon:%Y-%m-%d}...")
+    for name, moved in archive_all(horizon, batch_size, tables).items():
+        print(f"{name}: {moved} rows archived")
+    print(f"Archive totals: {archived_counts()}")
+
+@app.cli.command("import-recipients")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--keep-missing", is_flag=True, help="Do not deactivate recipients missing from the file.")
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows upserted per transaction.")
+def import_recipients_command(csv_file, keep_missing, chunk_size):
+    """Import SMS recipients from a CSV (name, phone_number, location)."""
+    from app.recipient_import import import_recipients, location_summary
+    result = import_recipients(csv_file, chunk_size=chunk_size, deactivate_missing=not keep_missing)
+    print(f"Rows read: {result['rows']}")
+    print(f"Inserted: {result['inserted']}, updated: {result['updated']}, "
+          f"unchanged: {result['unchanged']}, duplicates: {result['duplicates']}, "
+          f"deactivated: {result['deactivated']}, invalid: {result['invalid']}")
+    for error in result['errors']:
+        print(f"  line {error['line']}: {error['message']}")
+    print("\nActive recipients by location:")
+    for name, count in location_summary():
+        print(f"  - {name}: {count}")
+
 if __name__ == '__main__':
     # Set host to 0.0.0.0 to make the server externally visible
     # Set debug=False for production
@@ -21,13 +21,29 @@ CREATE TABLE IF NOT EXISTS `disease` (
   UNIQUE KEY `name` (`name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Table for administrative regions (state -> district)
+CREATE TABLE IF NOT EXISTS `region` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `name` varchar(100) NOT NULL,
+  `level` varchar(20) NOT NULL,
+  `parent_id` int(11) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_region_level_parent_name` (`level`, `parent_id`, `name`),
+  KEY `parent_id` (`parent_id`),
+  CONSTRAINT `region_ibfk_1` FOREIGN KEY (`parent_id`) REFERENCES `region` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- Table for locations
 CREATE TABLE IF NOT EXISTS `location` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
   `name` varchar(100) DEFAULT NULL,
   `latitude` float NOT NULL,
   `longitude` float NOT NULL,
-  PRIMARY KEY (`id`)
+  `region_id` int(11) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_location_lat_lng` (`latitude`, `longitude`),
+  KEY `ix_location_region` (`region_id`),
+  CONSTRAINT `location_ibfk_1` FOREIGN KEY (`region_id`) REFERENCES `region` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Table for cases
@@ -43,6 +59,7 @@ CREATE TABLE IF NOT EXISTS `case` (
   KEY `disease_id` (`disease_id`),
   KEY `location_id` (`location_id`),
   KEY `user_id` (`user_id`),
+  KEY `ix_case_location_date` (`location_id`, `case_date`),
   CONSTRAINT `case_ibfk_1` FOREIGN KEY (`disease_id`) REFERENCES `disease` (`id`),
   CONSTRAINT `case_ibfk_2` FOREIGN KEY (`location_id`) REFERENCES `location` (`id`),
   CONSTRAINT `case_ibfk_3` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`)
@@ -59,6 +76,7 @@ CREATE TABLE IF NOT EXISTS `environmental_data` (
   `temperature` float DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `location_id` (`location_id`),
+  KEY `ix_environmental_data_location_time` (`location_id`, `timestamp`),
   CONSTRAINT `environmental_data_ibfk_1` FOREIGN KEY (`location_id`) REFERENCES `location` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
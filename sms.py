@@ -0,0 +1,210 @@
+"""
+SMS providers.
+
+Broadcasts send through one provider per process, chosen by SMS_PROVIDER:
+
+    twilio  Twilio Messaging Service (default)
+    http    a generic HTTP gateway: POST JSON {to, body, sender} to
+            SMS_GATEWAY_URL, expecting {"id": ...} back
+    fake    the HTTP provider pointed at a FakeGateway started in-process,
+            for development and tests without a real gateway
+
+Providers are built once and reuse a pooled keep-alive HTTP session, so a
+broadcast does not open a new TLS connection per message or per request.
+FakeGateway simulates gateway latency and failures; `sms_benchmark.py`
+measures messages/sec against it.
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept open per provider, one per concurrently sending thread
+POOL_SIZE = int(os.environ.get('SMS_POOL_SIZE', os.environ.get('GUNICORN_THREADS', '16')))
+
+
+class SMSError(Exception):
+    """A message the provider did not accept."""
+
+
+def pooled_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class TwilioProvider:
+    name = 'twilio'
+
+    def __init__(self, account_sid=None, auth_token=None, messaging_service_sid=None):
+        self.account_sid = account_sid or os.environ.get('TWILIO_ACCOUNT_SID')
+        self.auth_token = auth_token or os.environ.get('TWILIO_AUTH_TOKEN')
+        self.messaging_service_sid = messaging_service_sid or os.environ.get('TWILIO_MESSAGING_SERVICE_SID')
+        self._client = None
+
+    def problem(self):
+        """Why this provider cannot send, or None."""
+        try:
+            import twilio  # noqa: F401
+        except ImportError:
+            return '⚠️ SMS service not configured. Please install Twilio: pip install twilio'
+        if not all([self.account_sid, self.auth_token, self.messaging_service_sid]):
+            return ('⚠️ Twilio credentials not configured. Please set TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, '
+                    'and TWILIO_MESSAGING_SERVICE_SID in your .env file.')
+        return None
+
+    def client(self):
+        if self._client is None:
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+
+            # TwilioHttpClient keeps its requests session; share it for pooled connections
+            http_client = TwilioHttpClient(pool_connections=True)
+            http_client.session = pooled_session()
+            self._client = Client(self.account_sid, self.auth_token, http_client=http_client)
+        return self._client
+
+    def send(self, to, body):
+        """Send one message; returns the provider's message id."""
+        message = self.client().messages.create(
+            messaging_service_sid=self.messaging_service_sid,
+            body=body,
+            to=to
+        )
+        return message.sid
+
+
+class HTTPGatewayProvider:
+    name = 'http'
+
+    def __init__(self, url=None, token=None, sender=None, timeout=None, session=None):
+        self.url = url or os.environ.get('SMS_GATEWAY_URL')
+        self.token = token or os.environ.get('SMS_GATEWAY_TOKEN')
+        self.sender = sender or os.environ.get('SMS_SENDER_ID')
+        self.timeout = timeout or float(os.environ.get('SMS_GATEWAY_TIMEOUT', '10'))
+        self.session = session or pooled_session()
+        if self.token:
+            self.session.headers['Authorization'] = f'Bearer {self.token}'
+
+    def problem(self):
+        if not self.url:
+            return '⚠️ SMS gateway not configured. Please set SMS_GATEWAY_URL in your .env file.'
+        return None
+
+    def send(self, to, body):
+        try:
+            response = self.session.post(
+                self.url,
+                json={'to': to, 'body': body, 'sender': self.sender},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise SMSError(f'Gateway unreachable: {e}') from e
+        if response.status_code >= 400:
+            raise SMSError(f'Gateway returned HTTP {response.status_code}: {response.text[:200]}')
+        try:
+            return str(response.json()['id'])
+        except (ValueError, KeyError) as e:
+            raise SMSError('Gateway response has no message id') from e
+
+
+class FakeGateway:
+    """Local HTTP server that accepts messages like an SMS gateway.
+
+    Each request waits latency seconds (plus up to jitter more) and fails
+    with HTTP 503 at failure_rate.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.accepted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/messages'
+
+    def _handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse connections; headers and body go out
+            # in separate writes, which Nagle would delay on a reused connection
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                time.sleep(gateway.latency + random.random() * gateway.jitter)
+                if not payload.get('to') or random.random() < gateway.failure_rate:
+                    with gateway._lock:
+                        gateway.rejected += 1
+                    self._reply(503, {'error': 'unavailable'})
+                    return
+                with gateway._lock:
+                    gateway.accepted += 1
+                    message_id = f'fake-{gateway.accepted}'
+                self._reply(200, {'id': message_id})
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-sms-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_provider = None
+_fake_gateway = None
+_lock = threading.Lock()
+
+
+def get_provider():
+    """The process-wide provider selected by SMS_PROVIDER."""
+    global _provider, _fake_gateway
+    if _provider is not None:
+        return _provider
+    with _lock:
+        if _provider is None:
+            name = os.environ.get('SMS_PROVIDER', 'twilio').lower()
+            if name == 'http':
+                _provider = HTTPGatewayProvider()
+            elif name == 'fake':
+                _fake_gateway = FakeGateway(
+                    latency=float(os.environ.get('SMS_FAKE_LATENCY', '0.05')),
+                    failure_rate=float(os.environ.get('SMS_FAKE_FAILURE_RATE', '0'))
+                ).start()
+                _provider = HTTPGatewayProvider(url=_fake_gateway.url)
+                print(f"✅ Fake SMS gateway listening at {_fake_gateway.url}")
+            else:
+                _provider = TwilioProvider()
+    return _provider
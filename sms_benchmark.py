@@ -0,0 +1,81 @@
+"""
+SMS send throughput against the local fake gateway.
+
+    python sms_benchmark.py -n 2000 -c 4 --latency 0.02 --failure-rate 0.05
+
+Starts a FakeGateway, then sends n messages through the HTTP provider from
+c threads, once with the shared pooled session and once opening a new
+session per message (how the Twilio client used to be built per request),
+and prints messages/sec and latency percentiles for each.
+"""
+import argparse
+import threading
+import time
+
+from sms import FakeGateway, HTTPGatewayProvider, SMSError, pooled_session
+
+
+def run_sends(make_provider, messages, concurrency):
+    """Send messages from concurrency threads; returns (messages/sec, latencies, failures)."""
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    per_worker = [messages // concurrency + (1 if i < messages % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        local = []
+        for i in range(count):
+            provider = make_provider()
+            start = time.perf_counter()
+            try:
+                provider.send(f'+9190000{i:05d}', 'Boil drinking water before use')
+            except SMSError:
+                with lock:
+                    failures[0] += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_worker]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return messages / elapsed, sorted(latencies), failures[0]
+
+
+def report(label, rate, latencies, failures):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    print(f"{label:<16} {rate:>9.1f} msg/s   p50 {percentile(0.5):7.1f} ms   "
+          f"p95 {percentile(0.95):7.1f} ms   failed {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--messages', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the gateway waits per message')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per message')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of messages the gateway rejects')
+    args = parser.parse_args()
+
+    gateway = FakeGateway(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate).start()
+    try:
+        shared = HTTPGatewayProvider(url=gateway.url, session=pooled_session(args.concurrency))
+        runs = [
+            ('pooled session', lambda: shared),
+            ('new per message', lambda: HTTPGatewayProvider(url=gateway.url)),
+        ]
+        for label, make_provider in runs:
+            run_sends(make_provider, min(args.messages, 50), args.concurrency)  # warm up
+            report(label, *run_sends(make_provider, args.messages, args.concurrency))
+    finally:
+        gateway.stop()
+
+
+if __name__ == '__main__':
+    main()
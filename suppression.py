@@ -0,0 +1,232 @@
+"""
+Alert deduplication and storm suppression.
+
+Alerts for a location are grouped into fixed time windows of
+ALERT_WINDOW_HOURS. The first alert in a window is inserted; a repeat at the
+same or a lower severity only bumps the window's suppression count, and a
+higher severity escalates the existing alert in place instead of adding
+another. The alert_window table (unique on location + severity + window
+start) is the shared record. A per-process index of the current window lets
+repeats at a severity already seen skip the lookup; creating or escalating
+always reads alert_window under a lock on the location row, so workers
+merge instead of duplicating. Repeated SMS broadcasts of the same text are
+filtered over a sliding window of the same length.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Alert, AlertWindow, Location, SMSHistory
+
+WINDOW = timedelta(hours=float(os.environ.get('ALERT_WINDOW_HOURS', '6')))
+
+SEVERITY_RANK = {'Low': 1, 'Medium': 2, 'High': 3}
+
+# location_id -> (window_start, {severity: (window id, alert id)}) for the current window
+_index = {}
+_lock = threading.Lock()
+
+
+def window_start(moment):
+    """Start of the fixed window containing moment (the unique key)."""
+    seconds = WINDOW.total_seconds()
+    return datetime.fromtimestamp(moment.timestamp() // seconds * seconds)
+
+
+def _cached_windows(location_id, start):
+    """{severity: (window id, alert id)} this process has seen in the window at start."""
+    with _lock:
+        cached = _index.get(location_id)
+        return dict(cached[1]) if cached and cached[0] == start else {}
+
+
+def _load_windows(location_id, start):
+    """Windows at start as stored in alert_window, read under a lock on the location.
+
+    The lock serializes creating and escalating for a location across
+    workers, and the locking read sees windows committed after this
+    transaction's snapshot.
+    """
+    db.session.query(Location.id).filter(Location.id == location_id).with_for_update().first()
+    windows = {
+        severity: (window_id, alert_id)
+        for window_id, severity, alert_id in db.session.query(
+            AlertWindow.id, AlertWindow.severity, AlertWindow.alert_id
+        ).filter(
+            AlertWindow.location_id == location_id,
+            AlertWindow.window_start == start
+        ).with_for_update()
+    }
+    with _lock:
+        _index[location_id] = (start, dict(windows))
+    return windows
+
+
+def _remember(location_id, start, severity, entry):
+    with _lock:
+        cached = _index.get(location_id)
+        if not cached or cached[0] != start:
+            cached = _index[location_id] = (start, {})
+        cached[1][severity] = entry
+
+
+def _top(windows):
+    return max(windows.items(), key=lambda item: SEVERITY_RANK.get(item[0], 0))
+
+
+def _suppress(window_id):
+    table = AlertWindow.__table__
+    db.session.execute(table.update().where(table.c.id == window_id).values(
+        suppressed=table.c.suppressed + 1,
+        last_seen=datetime.now()
+    ))
+
+
+def _open_window(location_id, severity, alert_id, now):
+    """Insert the window row; returns its id, or None if another request got there first."""
+    start = window_start(now)
+    window = AlertWindow(
+        location_id=location_id,
+        severity=severity,
+        window_start=start,
+        alert_id=alert_id,
+        opened_at=now,
+        last_seen=now
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(window)
+    except IntegrityError:
+        return None
+    _remember(location_id, start, severity, (window.id, alert_id))
+    return window.id
+
+
+def _drop_stale(location_id, windows):
+    """Close open windows whose alert was deleted or archived; returns the rest."""
+    alert_ids = {alert_id for _, alert_id in windows.values()}
+    live = {alert_id for (alert_id,) in db.session.query(Alert.id).filter(Alert.id.in_(alert_ids))}
+    stale = {severity: entry for severity, entry in windows.items() if entry[1] not in live}
+    if not stale:
+        return windows
+    # Their unique keys would otherwise swallow the next alert for this location
+    table = AlertWindow.__table__
+    db.session.execute(table.delete().where(table.c.id.in_([entry[0] for entry in stale.values()])))
+    with _lock:
+        cached = _index.get(location_id)
+        for severity in stale if cached else ():
+            cached[1].pop(severity, None)
+    return {severity: entry for severity, entry in windows.items() if severity not in stale}
+
+
+def submit_alert(location_id, severity, message, created_by=None, now=None):
+    """Create, escalate or suppress an alert; returns (alert, outcome).
+
+    outcome is 'created', 'escalated' or 'suppressed'. Only the first two
+    warrant notifying anyone. The caller commits.
+    """
+    now = now or datetime.now()
+    location_id = int(location_id)
+    rank = SEVERITY_RANK.get(severity, 0)
+    start = window_start(now)
+
+    # The process index only answers repeats it already covers; anything that
+    # would create or escalate is checked against alert_window first
+    windows = _cached_windows(location_id, start)
+    if not windows or rank > SEVERITY_RANK.get(_top(windows)[0], 0):
+        windows = _load_windows(location_id, start)
+    if windows:
+        windows = _drop_stale(location_id, windows)
+
+    if windows:
+        top_severity, (window_id, alert_id) = _top(windows)
+        if rank <= SEVERITY_RANK.get(top_severity, 0):
+            _suppress(window_id)
+            return Alert.query.get(alert_id), 'suppressed'
+        if _open_window(location_id, severity, alert_id, now) is None:
+            # Another request escalated to this severity at the same moment
+            return _suppress_raced(location_id, severity, now), 'suppressed'
+        # Escalate the open alert instead of adding a second one
+        alert = Alert.query.get(alert_id)
+        alert.severity = severity
+        alert.message = message
+        alert.alert_date = now
+        return alert, 'escalated'
+
+    alert = Alert(location_id=location_id, severity=severity, message=message, created_by=created_by)
+    db.session.add(alert)
+    db.session.flush()
+    if _open_window(location_id, severity, alert.id, now) is None:
+        # A concurrent request opened this window; keep its alert
+        raced = _suppress_raced(location_id, severity, now)
+        if raced is not None:
+            db.session.delete(alert)
+            return raced, 'suppressed'
+        # Its transaction rolled back after all, so this alert takes the window
+        _open_window(location_id, severity, alert.id, now)
+    return alert, 'created'
+
+
+def _suppress_raced(location_id, severity, now):
+    """Count a repeat against the window another request just opened; returns its alert.
+
+    The reads lock, so they see the other transaction's commit rather than
+    this transaction's snapshot. Returns None if the window is gone.
+    """
+    start = window_start(now)
+    row = db.session.query(AlertWindow.id, AlertWindow.alert_id).filter_by(
+        location_id=location_id, severity=severity, window_start=start
+    ).with_for_update().first()
+    if row is None:
+        return None
+    window_id, alert_id = row
+    _suppress(window_id)
+    _remember(location_id, start, severity, (window_id, alert_id))
+    return db.session.get(Alert, alert_id, with_for_update=True)
+
+
+def recently_notified(recipient_ids, message, now=None):
+    """Recipients who already got this exact message within the window."""
+    if not recipient_ids:
+        return set()
+    now = now or datetime.now()
+    return {
+        recipient_id for (recipient_id,) in db.session.query(SMSHistory.recipient_id).filter(
+            SMSHistory.recipient_id.in_(recipient_ids),
+            SMSHistory.message == message,
+            SMSHistory.status != 'failed',
+            SMSHistory.sent_at >= now - WINDOW
+        ).distinct()
+    }
+
+
+def suppression_counts(hours=24):
+    """Alerts created, escalated and suppressed per location over the last hours."""
+    since = datetime.now() - timedelta(hours=hours)
+    rows = db.session.query(
+        AlertWindow.location_id,
+        func.count(func.distinct(AlertWindow.alert_id)),
+        func.count(AlertWindow.id),
+        func.sum(AlertWindow.suppressed)
+    ).filter(
+        AlertWindow.opened_at >= since
+    ).group_by(AlertWindow.location_id).all()
+
+    locations = [{
+        'location_id': location_id,
+        'alerts': alerts,
+        # Every window after an alert's first one is an escalation
+        'escalated': windows - alerts,
+        'suppressed': int(suppressed or 0)
+    } for location_id, alerts, windows, suppressed in rows]
+    locations.sort(key=lambda row: -row['suppressed'])
+    return {
+        'hours': hours,
+        'alerts': sum(row['alerts'] for row in locations),
+        'escalated': sum(row['escalated'] for row in locations),
+        'suppressed': sum(row['suppressed'] for row in locations),
+        'locations': locations
+    }
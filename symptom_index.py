@@ -0,0 +1,232 @@
+"""
+Inverted index over Case.symptoms for syndromic surveillance.
+
+Each case's symptom text is tokenized into terms stored in the
+symptom_posting table together with the case's location, week and case
+count. Searches rank cases by TF-IDF over the postings and weekly
+aggregates are grouped straight from the postings, never scanning cases.
+Postings only know a case's week, so date ranges select whole weeks: a case
+matches when its week overlaps since..until. Archived cases keep their
+postings in archived_symptom_posting and are searched on request.
+"""
+import math
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, event, func, select, union_all
+
+from .models import db, ArchivedCase, ArchivedSymptomPosting, Case, Disease, Location, SymptomPosting
+
+STOPWORDS = {
+    'and', 'are', 'but', 'for', 'from', 'had', 'has', 'have', 'not', 'the',
+    'was', 'were', 'with', 'without', 'cases', 'case', 'reported',
+    'patient', 'patients', 'some', 'since', 'days', 'also',
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+DEFAULT_RESULTS = 50
+MAX_RESULTS = 200
+
+
+def tokenize(text):
+    """Split free text into normalized index terms."""
+    terms = []
+    for word in TOKEN_PATTERN.findall((text or '').lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        # Fold simple plurals: cramps -> cramp, stools -> stool
+        if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word[:64])
+    return terms
+
+
+def week_start(value):
+    """Monday of the week containing a date or datetime."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value - timedelta(days=value.weekday())
+
+
+def postings_for_case(case_row):
+    """Posting rows for one case."""
+    counts = Counter(tokenize(case_row.symptoms))
+    week = week_start(case_row.case_date or datetime.now())
+    return [{
+        'term': term,
+        'case_id': case_row.id,
+        'location_id': case_row.location_id,
+        'week_start': week,
+        'num_cases': int(case_row.num_cases or 1),
+        'term_count': count
+    } for term, count in counts.items()]
+
+
+@event.listens_for(Case, 'after_insert')
+def _index_new_case(mapper, connection, target):
+    rows = postings_for_case(target)
+    if rows:
+        connection.execute(SymptomPosting.__table__.insert(), rows)
+
+
+@event.listens_for(Case, 'after_delete')
+def _unindex_deleted_case(mapper, connection, target):
+    table = SymptomPosting.__table__
+    connection.execute(table.delete().where(table.c.case_id == target.id))
+
+
+# (case model, posting model) of live and archived cases
+SOURCES = ((Case, SymptomPosting), (ArchivedCase, ArchivedSymptomPosting))
+
+
+def rebuild(batch_size=1000):
+    """Rebuild the whole index from the live and archived cases; returns cases indexed."""
+    indexed = 0
+    for case_model, posting_model in SOURCES:
+        posting_model.query.delete()
+        batch = []
+        for case_row in case_model.query.order_by(case_model.id).yield_per(batch_size):
+            batch.extend(postings_for_case(case_row))
+            indexed += 1
+            if len(batch) >= batch_size:
+                db.session.execute(posting_model.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(posting_model.__table__.insert(), batch)
+    db.session.commit()
+    return indexed
+
+
+def _sources(include_archived):
+    return SOURCES if include_archived else SOURCES[:1]
+
+
+def _filtered_postings(terms, location_id=None, since=None, until=None, include_archived=False):
+    """Postings for the given terms as a subquery, restricted by location and the weeks overlapping since..until."""
+    selects = []
+    for _, model in _sources(include_archived):
+        query = select(
+            model.term, model.case_id, model.location_id, model.week_start, model.num_cases, model.term_count
+        ).where(model.term.in_(terms))
+        if location_id:
+            query = query.where(model.location_id == location_id)
+        if since:
+            query = query.where(model.week_start >= week_start(since))
+        if until:
+            query = query.where(model.week_start <= until)
+        selects.append(query)
+    return (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+
+
+def search(text, location_id=None, since=None, until=None, limit=DEFAULT_RESULTS, include_archived=False):
+    """Cases whose symptoms contain every term of the query, best matches first.
+
+    since and until are matched by week, so cases a few days outside the
+    range but in its first or last week are included.
+    """
+    limit = min(max(int(limit), 1), MAX_RESULTS)
+    terms = sorted(set(tokenize(text)))
+    if not terms:
+        return []
+
+    # Inverse document frequency from the postings of the query terms only
+    total_cases = 0
+    document_counts = Counter()
+    for _, model in _sources(include_archived):
+        total_cases += db.session.query(func.count(func.distinct(model.case_id))).scalar() or 0
+        document_counts.update(dict(db.session.query(
+            model.term,
+            func.count(model.case_id)
+        ).filter(model.term.in_(terms)).group_by(model.term).all()))
+    if len(document_counts) < len(terms):
+        return []
+    idf = {term: math.log(1 + total_cases / document_counts[term]) for term in terms}
+
+    postings = _filtered_postings(terms, location_id, since, until, include_archived)
+    score = func.sum(case(
+        *[(postings.c.term == term, postings.c.term_count * weight) for term, weight in idf.items()],
+        else_=0
+    )).label('score')
+    matches = db.session.query(
+        postings.c.case_id,
+        score
+    ).group_by(
+        postings.c.case_id
+    ).having(
+        func.count(postings.c.term) == len(terms)
+    ).order_by(score.desc(), postings.c.case_id.desc()).limit(limit).all()
+
+    if not matches:
+        return []
+
+    # Details for the ranked page only
+    scores = {case_id: value for case_id, value in matches}
+    rows = []
+    for model, _ in _sources(include_archived):
+        rows.extend(db.session.query(
+            model.id,
+            model.case_date,
+            model.symptoms,
+            model.num_cases,
+            Disease.name.label('disease_name'),
+            Location.id.label('location_id'),
+            Location.name.label('location_name')
+        ).join(
+            Disease, model.disease_id == Disease.id
+        ).join(
+            Location, model.location_id == Location.id
+        ).filter(model.id.in_(scores)).all())
+
+    results = [{
+        'case_id': row.id,
+        'score': round(float(scores[row.id]), 4),
+        'case_date': row.case_date.isoformat() if row.case_date else None,
+        'symptoms': row.symptoms,
+        'num_cases': row.num_cases,
+        'disease': row.disease_name,
+        'location_id': row.location_id,
+        'location': row.location_name
+    } for row in rows]
+    results.sort(key=lambda result: (-result['score'], -result['case_id']))
+    return results
+
+
+def weekly_counts(text, location_id=None, since=None, until=None, include_archived=False):
+    """Matching cases aggregated per location and week."""
+    terms = sorted(set(tokenize(text)))
+    if not terms:
+        return []
+
+    postings = _filtered_postings(terms, location_id, since, until, include_archived)
+    matched = select(
+        postings.c.case_id,
+        postings.c.location_id,
+        postings.c.week_start,
+        postings.c.num_cases
+    ).group_by(
+        postings.c.case_id,
+        postings.c.location_id,
+        postings.c.week_start,
+        postings.c.num_cases
+    ).having(
+        func.count(postings.c.term) == len(terms)
+    ).subquery()
+
+    rows = db.session.query(
+        matched.c.location_id,
+        matched.c.week_start,
+        func.count(matched.c.case_id),
+        func.sum(matched.c.num_cases)
+    ).group_by(
+        matched.c.location_id,
+        matched.c.week_start
+    ).order_by(matched.c.week_start, matched.c.location_id).all()
+
+    return [{
+        'location_id': location_id,
+        'week_start': week.isoformat(),
+        'reports': reports,
+        'num_cases': int(num_cases or 0)
+    } for location_id, week, reports, num_cases in rows]
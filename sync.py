@@ -0,0 +1,170 @@
+"""
+Offline-first batch sync for field health workers.
+
+A device uploads its queued case reports in one request, each tagged with a
+client-generated idempotency key, and gets back the diseases and locations
+added since its last sync token. Reports already received under the same
+key are acknowledged without being inserted again, so retries over flaky
+connections are safe.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Case, Disease, Location, SyncReceipt
+from .classifier import UNCONFIRMED_DISEASE, get_model, save_classifications, unconfirmed_disease_id
+
+# Largest number of reports accepted in one sync
+MAX_BATCH = 200
+
+
+def encode_token(disease_id, location_id):
+    raw = json.dumps({'d': disease_id, 'l': location_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_token(token):
+    """Return (max_disease_id, max_location_id) seen by the client; (0, 0) for a first sync."""
+    if not token:
+        return 0, 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return int(data['d']), int(data['l'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid sync token')
+
+
+def _validate(report):
+    """Return cleaned report fields; raises ValueError with a message for the client."""
+    key = str(report.get('key') or '').strip()
+    if not key or len(key) > 64:
+        raise ValueError('key is required (max 64 characters)')
+    try:
+        latitude = float(report['latitude'])
+        longitude = float(report['longitude'])
+        num_cases = int(report.get('num_cases') or 1)
+        disease_id = int(report['disease_id']) if report.get('disease_id') else None
+        reported_at = datetime.fromisoformat(report['reported_at']) if report.get('reported_at') else None
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('latitude, longitude, num_cases, disease_id or reported_at is invalid')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or num_cases < 1:
+        raise ValueError('Coordinates or num_cases out of range')
+    if reported_at and reported_at.tzinfo:
+        reported_at = reported_at.astimezone().replace(tzinfo=None)
+    return {
+        'key': key,
+        'latitude': latitude,
+        'longitude': longitude,
+        'num_cases': num_cases,
+        'disease_id': disease_id,
+        'symptoms': report.get('symptoms') or '',
+        'reported_at': reported_at
+    }
+
+
+def _store_reports(user_id, reports):
+    """Insert new reports in one transaction; returns (accepted, duplicates)."""
+    keys = [report['key'] for report in reports]
+    received = dict(db.session.query(SyncReceipt.idempotency_key, SyncReceipt.case_id).filter(
+        SyncReceipt.user_id == user_id,
+        SyncReceipt.idempotency_key.in_(keys)
+    ).all())
+    duplicates = [{'key': key, 'case_id': received[key]} for key in keys if key in received]
+    new_reports = [report for report in reports if report['key'] not in received]
+    if not new_reports:
+        return [], duplicates
+
+    # Resolve every coordinate pair with one query, creating the missing ones
+    pairs = {(report['latitude'], report['longitude']) for report in new_reports}
+    locations = {
+        (location.latitude, location.longitude): location
+        for location in Location.query.filter(tuple_(Location.latitude, Location.longitude).in_(pairs))
+    }
+    for pair in pairs - set(locations):
+        locations[pair] = Location(latitude=pair[0], longitude=pair[1], name="Case Location")
+        db.session.add(locations[pair])
+
+    disease_ids = {disease_id for (disease_id,) in db.session.query(Disease.id)}
+    unconfirmed_id = unconfirmed_disease_id()
+    cases = []
+    for report in new_reports:
+        disease_id = report['disease_id'] if report['disease_id'] in disease_ids else None
+        case_row = Case(
+            disease_id=disease_id or unconfirmed_id,
+            location=locations[(report['latitude'], report['longitude'])],
+            user_id=user_id,
+            symptoms=report['symptoms'],
+            num_cases=report['num_cases'],
+            case_date=report['reported_at']
+        )
+        db.session.add(case_row)
+        cases.append((report, case_row, disease_id is None))
+    db.session.flush()
+
+    for report, case_row, _ in cases:
+        db.session.add(SyncReceipt(user_id=user_id, idempotency_key=report['key'], case_id=case_row.id))
+
+    # Suggest diseases for unconfirmed reports in one vectorized batch
+    pending = [(report, case_row) for report, case_row, needs_class in cases if needs_class]
+    if pending:
+        model = get_model()
+        scores = model.score_batch([report['symptoms'] for report, _ in pending])
+        results = []
+        for (_, case_row), row in zip(pending, scores):
+            disease_id, _, score = model.best(row)
+            results.append((case_row.id, disease_id, score))
+        save_classifications(results, model.version)
+
+    db.session.commit()
+    return [{'key': report['key'], 'case_id': case_row.id} for report, case_row, _ in cases], duplicates
+
+
+def sync(user_id, payload):
+    """Process one sync request; returns the response body as a dict."""
+    reports = payload.get('reports') or []
+    if not isinstance(reports, list) or len(reports) > MAX_BATCH:
+        raise ValueError(f'reports must be a list of at most {MAX_BATCH} items')
+    last_disease_id, last_location_id = decode_token(payload.get('sync_token'))
+
+    valid, rejected, keys = [], [], set()
+    for report in reports:
+        try:
+            report = _validate(report if isinstance(report, dict) else {})
+        except ValueError as e:
+            rejected.append({'key': report.get('key') if isinstance(report, dict) else None, 'message': str(e)})
+            continue
+        if report['key'] in keys:
+            continue
+        keys.add(report['key'])
+        valid.append(report)
+
+    try:
+        accepted, duplicates = _store_reports(user_id, valid)
+    except IntegrityError:
+        # Another request stored some of these keys first; the retry sees them as duplicates
+        db.session.rollback()
+        accepted, duplicates = _store_reports(user_id, valid)
+
+    # Reference data added since the client's last sync, as compact rows
+    diseases = db.session.query(Disease.id, Disease.name).filter(
+        Disease.id > last_disease_id,
+        Disease.name != UNCONFIRMED_DISEASE
+    ).order_by(Disease.id).all()
+    locations = db.session.query(Location.id, Location.name, Location.latitude, Location.longitude).filter(
+        Location.id > last_location_id
+    ).order_by(Location.id).all()
+
+    return {
+        'accepted': accepted,
+        'duplicates': duplicates,
+        'rejected': rejected,
+        'diseases': [list(row) for row in diseases],
+        'locations': [list(row) for row in locations],
+        'sync_token': encode_token(
+            diseases[-1].id if diseases else last_disease_id,
+            locations[-1].id if locations else last_location_id
+        )
+    }
@@ -0,0 +1,121 @@
+"""
+Template fragment caching and the compiled-template bytecode cache.
+
+Templates can wrap a block that only changes with its data in a cache tag
+keyed by a name and one or more watermarks:
+
+    {% cache 'disease_options', watermark(diseases) %}
+      {% for disease in diseases %}<option value="{{ disease.id }}">{{ disease.name }}</option>{% endfor %}
+    {% endcache %}
+
+The block is rendered once per process for each watermark and replayed
+from memory afterwards; a new watermark (a row added or removed) renders it
+again. Fragments are shared between users, so only cache markup that is
+the same for everyone who sees it.
+
+Compiled templates are written to a bytecode cache directory, so new
+gunicorn workers and restarted servers load templates without compiling
+them from source, and `warm(app)` compiles every template in the master
+before the workers fork.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+# Rendered fragments kept per process; the least recently used go first
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', '256'))
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments."""
+
+    def __init__(self, size=FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+            return fragment
+
+    def set(self, key, fragment):
+        with self._lock:
+            self._fragments[key] = fragment
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+fragments = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache name, watermark... %}...{% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_cached', [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _cached(self, key, caller):
+        key = tuple(key)
+        fragment = fragments.get(key)
+        if fragment is None:
+            fragment = caller()
+            fragments.set(key, fragment)
+        return fragment
+
+
+def watermark(rows):
+    """Cheap key that changes when rows are added or removed."""
+    rows = list(rows)
+    return len(rows), max((getattr(row, 'id', 0) or 0 for row in rows), default=0)
+
+
+def bytecode_cache():
+    """Cache in TEMPLATE_CACHE_DIR, or Jinja's private per-user temp directory."""
+    directory = os.environ.get('TEMPLATE_CACHE_DIR')
+    if not directory:
+        # Jinja creates it with mode 0700 and refuses one owned by another user
+        return FileSystemBytecodeCache()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def init_app(app):
+    """Enable the cache tag and the bytecode cache on the app's Jinja environment."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['watermark'] = watermark
+    try:
+        app.jinja_env.bytecode_cache = bytecode_cache()
+    except OSError as e:
+        print(f"⚠️ Template bytecode cache disabled: {e}")
+
+
+def warm(app):
+    """Compile every template now; returns how many were loaded."""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            print(f"⚠️ Could not compile template {name}: {e}")
+    return count